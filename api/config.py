@@ -23,10 +23,10 @@ DEEPSEEK_INPUT_COST = 0.14
 DEEPSEEK_OUTPUT_COST = 0.28
 
 # Essential libraries (auto-added if missing)
-ESSENTIAL_LIBRARIES = [
+ESSENTIAL_LIBRARIES = (
     'fabric-api',
     'cloth-config',
-]
+)
 
 # Fabric compatibility connector mods
 CONNECTOR_MODS = ['u58R1TMW', 'Aqlf1Shp', 'FYpiwiBR']
@@ -3,7 +3,7 @@ Main Crash Doctor Analysis Pipeline
 Объединяет все компоненты для полного анализа краша
 """
 
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 from .log_sanitizer import sanitize_crash_log, sanitize_game_log, extract_crash_info
 from .crash_analyzer import analyze_crash, validate_analysis
 from .fix_planner import plan_fixes
@@ -16,7 +16,8 @@ def analyze_and_fix_crash(
     game_log: Optional[str] = None,
     mc_version: Optional[str] = None,
     mod_loader: Optional[str] = None,
-    deepseek_key: str = None
+    deepseek_key: str = None,
+    on_suggestion: Optional[Callable[[Dict], None]] = None
 ) -> Dict:
     """
     Полный pipeline анализа и исправления краша
@@ -28,6 +29,8 @@ def analyze_and_fix_crash(
         mc_version: Версия MC (опционально, будет извлечена из лога)
         mod_loader: Загрузчик (опционально, будет извлечён из лога)
         deepseek_key: API ключ DeepSeek
+        on_suggestion: Опциональный callback - вызывается для каждого suggestion сразу после
+            планирования фиксов, до создания patched board_state (для стриминга через SSE)
         
     Returns:
         Dict с результатом: success, suggestions, patched_board_state, confidence, token_usage, warnings
@@ -131,6 +134,11 @@ def analyze_and_fix_crash(
     if fix_plan.get('warnings'):
         print(f"   ⚠️  {len(fix_plan['warnings'])} warnings")
     
+    suggestions = [_build_suggestion(op) for op in fix_plan.get('operations', [])]
+    if on_suggestion:
+        for suggestion in suggestions:
+            on_suggestion(suggestion)
+    
     # 4. Создание patched board_state
     print("\n🔧 [Step 4] Creating patched board_state...")
     patched_result = create_patched_board_state(
@@ -153,23 +161,7 @@ def analyze_and_fix_crash(
         'root_cause': analysis.get('root_cause', 'Unknown'),
         'error_category': analysis.get('error_category', 'unknown'),
         'confidence': analysis.get('confidence', 0.0),
-        'suggestions': [
-            {
-                'action': op.get('action'),
-                'target_mod': op.get('target_mod', op.get('mod', 'Unknown')),
-                'reason': op.get('reason', ''),
-                'priority': op.get('priority', 'medium'),
-                'confidence': op.get('confidence', 0.5),
-                'success': op.get('success', True),
-                'mod_source_id': op.get('mod_source_id'),  # Добавляем mod_source_id
-                'mod_slug': op.get('mod_slug'),  # Добавляем mod_slug
-                # Для update_mod добавляем информацию об обновлении
-                'file_url': op.get('file_url'),
-                'latest_filename': op.get('latest_filename'),
-                'latest_version': op.get('latest_version')
-            }
-            for op in fix_plan.get('operations', [])
-        ],
+        'suggestions': suggestions,
         'patched_board_state': patched_result['patched_board_state'],
         'fix_summary': {
             'total_fixes': fix_plan['total_fixes'],
@@ -190,3 +182,20 @@ def analyze_and_fix_crash(
     
     return result
 
+
+def _build_suggestion(op: Dict) -> Dict:
+    """Формирует suggestion для клиента из операции fix plan'а"""
+    return {
+        'action': op.get('action'),
+        'target_mod': op.get('target_mod', op.get('mod', 'Unknown')),
+        'reason': op.get('reason', ''),
+        'priority': op.get('priority', 'medium'),
+        'confidence': op.get('confidence', 0.5),
+        'success': op.get('success', True),
+        'mod_source_id': op.get('mod_source_id'),  # Добавляем mod_source_id
+        'mod_slug': op.get('mod_slug'),  # Добавляем mod_slug
+        # Для update_mod добавляем информацию об обновлении
+        'file_url': op.get('file_url'),
+        'latest_filename': op.get('latest_filename'),
+        'latest_version': op.get('latest_version')
+    }
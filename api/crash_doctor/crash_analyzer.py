@@ -49,7 +49,9 @@ def analyze_crash(
     # Логируем размеры данных для отладки
     crash_log_size = len(unified_data.get('crash_log', ''))
     game_log_size = len(unified_data.get('game_log', '')) if unified_data.get('game_log') else 0
-    unified_json_size = len(json.dumps(unified_data, ensure_ascii=False))
+    # Сериализуем один раз - та же строка уходит в промпт ниже
+    unified_json = json.dumps(unified_data, indent=2, ensure_ascii=False)
+    unified_json_size = len(unified_json)
     
     print(f"   📦 Extracted {len(mods_list)} mods from board_state (categories/metadata filtered out)")
     print(f"   📊 Unified JSON size: {unified_json_size:,} chars (crash_log: {crash_log_size:,}, game_log: {game_log_size:,}, mods: {len(mods_list)})")
@@ -160,7 +162,7 @@ IMPORTANT:
     
     user_prompt = f"""CRASH ANALYSIS DATA (JSON):
 
-{json.dumps(unified_data, indent=2, ensure_ascii=False)}
+{unified_json}
 
 ⚠️ CRITICAL: You can ONLY suggest fixes for mods that are in the "mods" array above.
 DO NOT suggest adding mods that are not in this list UNLESS they are explicitly mentioned as missing dependencies in the crash log.
@@ -8,6 +8,99 @@ from typing import Dict, List, Tuple
 from datetime import datetime
 
 
+# Маркеры строк, которые выкидываем целиком
+_DEBUG_MARKERS = ('[DEBUG]', '[TRACE]')
+# Префиксы строк с исключениями/ошибками
+_EXC_PREFIXES = ('Exception', 'Error')
+
+# PII: пути пользователя (Windows/Linux/macOS), UUIDs и access tokens.
+# Паттерны не пересекают '\n', поэтому применяются сразу ко всему логу - результат как построчно
+_PATH_RE = re.compile(r'[A-Z]:\\Users\\[^\\\n]+|/home/[^/\n]+|/Users/[^/\n]+', re.IGNORECASE)
+_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)
+_TOKEN_RE = re.compile(r'--accessToken, [^,\]\n]+')
+_GAME_PATH_RES = [
+    re.compile(r'[A-Z]:\\Users\\[^\\\n]+'),
+    re.compile(r'/home/[^/\n]+'),
+]
+
+# Ключевые слова важных строк crash log (любые проблемы, не только dependencies)
+_CRASH_IMPORTANT_KEYWORDS = [
+    '-- ',  # Все секции с "--" (Mod loading issue, System Details, etc.)
+    'Mod loading issue',
+    'Failure message',
+    'requires',
+    'not installed',
+    'incompatible',
+    'conflict',
+    'Minecraft Version',
+    'ModLauncher',
+    'neoforge',
+    'forge',
+    'fabric',
+    'Missing',
+    'mandatory dependencies',
+    'Mod List:',
+    'Exception',
+    'Error',
+    'FATAL',
+    'WARN',
+    'CRASH',
+    'Crash Report',
+    'Description:',
+    'Stacktrace',
+    'Caused by',
+    'at ',
+    'java.lang.',
+    'java.util.'
+]
+# Заранее в нижнем регистре - строка лога приводится к lower один раз
+_CRASH_KEYWORDS_LC = tuple(keyword.lower() for keyword in _CRASH_IMPORTANT_KEYWORDS)
+
+# Важные ключевые слова game log (ошибки, предупреждения, проблемы).
+# Проверяются как подстроки, не как регулярки ('target.*was not found' - литерал)
+_GAME_IMPORTANT_KEYWORDS = [
+    'ERROR', 'WARN', 'FATAL', 'CRASH',
+    'Exception', 'Error', 'Failed',
+    'ClassNotFoundException', 'NoClassDefFoundError',
+    'Mixin', '@Mixin', 'target.*was not found',
+    'is a Fabric mod and cannot be loaded',
+    'Skipping jar',
+    'Connector', 'connectorextras',
+    'Mod loading issue', 'Failure message',
+    'requires', 'not installed', 'Missing',
+    'incompatible', 'conflict',
+    'ModLauncher', 'Mod List:'
+]
+_GAME_KEYWORDS_LC = tuple(keyword.lower() for keyword in _GAME_IMPORTANT_KEYWORDS)
+
+# Тип ошибки по маркерам, в порядке приоритета (после mixin_error).
+# Третий элемент - искать в log_lower (маркеры в нижнем регистре) или в исходном log (с учётом регистра)
+_ERROR_TYPE_MARKERS = (
+    ('class_not_found', ('ClassNotFoundException', 'NoClassDefFoundError'), False),
+    ('fabric_mod_on_neoforge', ('is a fabric mod and cannot be loaded',), True),
+    ('dependency_or_loading', ('is not installed', 'Missing', 'requires'), False),
+    ('mod_conflict', ('conflict', 'incompatible'), True),
+    ('memory', ('OutOfMemoryError',), False),
+    ('runtime_error', ('IllegalArgumentException', 'NullPointerException', 'RuntimeException'), False),
+)
+
+# Сколько строк списка модов оставлять в начале и в конце
+MOD_LIST_HEAD = 30
+MOD_LIST_TAIL = 10
+
+
+def _collapse_mod_list(mod_list_lines: List[str], marker: str) -> List[str]:
+    """Оставляет первые MOD_LIST_HEAD и последние MOD_LIST_TAIL строк списка модов"""
+    if len(mod_list_lines) > MOD_LIST_HEAD + MOD_LIST_TAIL:
+        return mod_list_lines[:MOD_LIST_HEAD] + [marker] + mod_list_lines[-MOD_LIST_TAIL:]
+    return mod_list_lines
+
+
+def _truncate_middle(text: str, max_length: int) -> str:
+    """Оставляет начало и конец текста, собирая результат одним join без промежуточных склеек"""
+    return ''.join((text[:max_length // 2], '\n... [TRUNCATED] ...\n', text[-max_length // 2:]))
+
+
 def sanitize_crash_log(crash_log: str, max_length: int = 20000) -> Dict[str, any]:
     """
     Очищает crash log от мусора, извлекает ключевую информацию
@@ -28,58 +121,17 @@ def sanitize_crash_log(crash_log: str, max_length: int = 20000) -> Dict[str, any
         }
     
     original_length = len(crash_log)
-    lines = crash_log.split('\n')
+    # 1. Удаляем PII (пути пользователя), UUIDs и access tokens - сразу по всему логу
+    sanitized = _PATH_RE.sub('[USER_PATH]', crash_log)
+    sanitized = _UUID_RE.sub('[UUID]', sanitized)
+    sanitized = _TOKEN_RE.sub('--accessToken, [REDACTED]', sanitized)
+    
+    # lower() один раз на весь буфер вместо вызова на каждой строке;
+    # lower() не создаёт '\n', поэтому списки строк совпадают по индексам
+    lines = sanitized.split('\n')
+    lower_lines = sanitized.lower().split('\n')
     original_lines = len(lines)
     
-    # 1. Удаляем PII (пути пользователя) и UUIDs
-    sanitized_lines = []
-    path_patterns = [
-        r'C:\\Users\\[^\\]+',       # Windows C:\Users\...
-        r'[A-Z]:\\Users\\[^\\]+',   # Windows user paths
-        r'/home/[^/]+',              # Linux home paths
-        r'/Users/[^/]+',             # macOS home paths
-    ]
-    
-    for line in lines:
-        sanitized_line = line
-        for pattern in path_patterns:
-            sanitized_line = re.sub(pattern, '[USER_PATH]', sanitized_line, flags=re.IGNORECASE)
-        # Удаляем UUIDs и access tokens
-        sanitized_line = re.sub(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '[UUID]', sanitized_line, flags=re.IGNORECASE)
-        sanitized_line = re.sub(r'--accessToken, [^,\]]+', '--accessToken, [REDACTED]', sanitized_line)
-        sanitized_lines.append(sanitized_line)
-    
-    # 2. СОХРАНЯЕМ ВСЕ ВАЖНЫЕ СЕКЦИИ (любые проблемы, не только dependencies)
-    important_keywords = [
-        '-- ',  # Все секции с "--" (Mod loading issue, System Details, etc.)
-        'Mod loading issue',
-        'Failure message',
-        'requires',
-        'not installed',
-        'incompatible',
-        'conflict',
-        'Minecraft Version',
-        'ModLauncher',
-        'neoforge',
-        'forge',
-        'fabric',
-        'Missing',
-        'mandatory dependencies',
-        'Mod List:',
-        'Exception',
-        'Error',
-        'FATAL',
-        'WARN',
-        'CRASH',
-        'Crash Report',
-        'Description:',
-        'Stacktrace',
-        'Caused by',
-        'at ',
-        'java.lang.',
-        'java.util.'
-    ]
-    
     # 3. Удаляем повторяющиеся сообщения "Cowardly refusing to send event"
     unique_lines = []
     seen_refusing = set()
@@ -87,9 +139,20 @@ def sanitize_crash_log(crash_log: str, max_length: int = 20000) -> Dict[str, any
     # 4. Удаляем огромные списки библиотек и модов (оставляем только начало/конец)
     in_mod_list = False
     mod_list_lines = []
-    mod_list_start_idx = None
-    
-    for i, line in enumerate(sanitized_lines):
+    # Предыдущая строка была добавлена в список модов - проверяем, не закончился ли он
+    check_list_end = False
+    
+    for line, line_lower in zip(lines, lower_lines):
+        # Список модов закончился (пустая строка или следующий блок) - сохраняем только первые 30 и последние 10
+        if check_list_end and (
+            line.strip() == '' or line.find('[', 0, 10) != -1 or line.find('--', 0, 5) != -1
+        ):
+            marker = '... [TRUNCATED: {} mods] ...'.format(len(mod_list_lines) - MOD_LIST_HEAD - MOD_LIST_TAIL)
+            unique_lines.extend(_collapse_mod_list(mod_list_lines, marker))
+            in_mod_list = False
+            mod_list_lines = []
+        check_list_end = False
+        
         # Пропускаем повторяющиеся "Cowardly refusing"
         if 'Cowardly refusing to send event' in line:
             if line not in seen_refusing:
@@ -99,68 +162,50 @@ def sanitize_crash_log(crash_log: str, max_length: int = 20000) -> Dict[str, any
         # Обнаруживаем начало списка модов
         if 'Mod List:' in line or 'Name Version (Mod Id)' in line:
             in_mod_list = True
-            mod_list_start_idx = i
             mod_list_lines = [line]
             unique_lines.append(line)
             continue
         
-        # Если в списке модов - сохраняем только первые N и последние M строк
+        # Если в списке модов - копим строки, обрежем когда список закончится
         if in_mod_list:
             mod_list_lines.append(line)
-            # Если список закончился (пустая строка после или следующий блок)
-            if i < len(sanitized_lines) - 1:
-                next_line = sanitized_lines[i + 1]
-                if next_line.strip() == '' or '[' in next_line[:10] or '--' in next_line[:5]:
-                    # Закончился список, сохраняем только первые 30 и последние 10
-                    if len(mod_list_lines) > 40:
-                        important_lines = mod_list_lines[:30] + ['... [TRUNCATED: {} mods] ...'.format(len(mod_list_lines) - 40)] + mod_list_lines[-10:]
-                        unique_lines.extend(important_lines)
-                    else:
-                        unique_lines.extend(mod_list_lines)
-                    in_mod_list = False
-                    mod_list_lines = []
-                continue
-            else:
-                # Конец файла
-                if len(mod_list_lines) > 40:
-                    important_lines = mod_list_lines[:30] + ['... [TRUNCATED] ...'] + mod_list_lines[-10:]
-                    unique_lines.extend(important_lines)
-                else:
-                    unique_lines.extend(mod_list_lines)
-                in_mod_list = False
-                continue
+            check_list_end = True
+            continue
         
         # Удаляем DEBUG/TRACE сообщения (слишком много)
-        if '[DEBUG]' in line or '[TRACE]' in line:
+        if any(marker in line for marker in _DEBUG_MARKERS):
             continue
         
-        # Сохраняем важные строки - либо содержат ключевые слова, либо это секции с "--"
-        is_important = any(keyword.lower() in line.lower() for keyword in important_keywords)
-        
-        # Всегда сохраняем секции (начинаются с "--")
-        is_section = line.strip().startswith('--')
+        stripped = line.strip()
         
-        # Сохраняем исключения и ошибки
-        is_exception = line.strip().startswith('Exception') or line.strip().startswith('Error') or 'Exception' in line
-        
-        # Сохраняем строки с модами или проблемами
-        has_mod_info = 'Mod' in line or 'mod' in line.lower()
-        
-        if is_important or is_section or is_exception or has_mod_info:
+        # Сначала дешёвые проверки, полный перебор ключевых слов - только если они не сработали:
+        # секции (начинаются с "--"), исключения и ошибки, строки с модами, ключевые слова
+        if (
+            stripped.startswith('--')
+            or stripped.startswith(_EXC_PREFIXES) or 'Exception' in line
+            or 'mod' in line_lower
+            or any(keyword in line_lower for keyword in _CRASH_KEYWORDS_LC)
+        ):
             unique_lines.append(line)
     
+    # Конец файла внутри списка модов
+    if check_list_end:
+        unique_lines.extend(_collapse_mod_list(mod_list_lines, '... [TRUNCATED] ...'))
+    
+    # Склеиваем один раз - строка используется и для extract_crash_info, и как результат
+    sanitized_log = '\n'.join(unique_lines)
+    kept_line_count = len(unique_lines)
+    
     # 3. Извлекаем ключевую информацию
-    extracted_info = extract_crash_info('\n'.join(unique_lines))
+    extracted_info = extract_crash_info(sanitized_log)
     
     # 4. Обрезаем до max_length если нужно
-    sanitized_log = '\n'.join(unique_lines)
     if len(sanitized_log) > max_length:
         # Берем начало (где обычно ошибка) и конец (где обычно стек)
-        head = sanitized_log[:max_length // 2]
-        tail = sanitized_log[-max_length // 2:]
-        sanitized_log = head + '\n... [TRUNCATED] ...\n' + tail
+        sanitized_log = _truncate_middle(sanitized_log, max_length)
     
-    lines_removed = original_lines - len(sanitized_log.split('\n'))
+    # Считаем по строкам до обрезки по max_length (без повторного split)
+    lines_removed = original_lines - kept_line_count
     
     return {
         'sanitized_log': sanitized_log,
@@ -196,6 +241,7 @@ def extract_crash_info(log: str) -> Dict[str, any]:
         'fabric': [r'fabric-loader', r'fabric\s+loader']
     }
     
+    # Один раз приводим лог к нижнему регистру и переиспользуем ниже
     log_lower = log.lower()
     for loader, patterns in loader_patterns.items():
         if any(re.search(pattern, log_lower) for pattern in patterns):
@@ -224,7 +270,8 @@ def extract_crash_info(log: str) -> Dict[str, any]:
     mod_hint_pattern = r'([A-Z][a-zA-Z0-9\s]+(?:Mod|API|Lib))'
     matches = re.findall(mod_hint_pattern, log)
     if matches:
-        info['conflicting_mods_hints'] = list(set(matches[:10]))
+        # Порядок появления в логе сохраняется, берём первые 10 уникальных
+        info['conflicting_mods_hints'] = list(dict.fromkeys(matches))[:10]
     
     # Ищем mixin ошибки (критично для Connector)
     mixin_error_patterns = [
@@ -254,28 +301,19 @@ def extract_crash_info(log: str) -> Dict[str, any]:
             connector_issues.extend(matches)
     
     if connector_issues:
-        info['connector_issues'] = list(set(connector_issues))
+        info['connector_issues'] = list(dict.fromkeys(connector_issues))
     
     # Определяем тип ошибки
-    log_lower = log.lower()
-    
     # Mixin/Class loading ошибки (критично для Connector)
     if 'mixin' in log_lower and ('target' in log_lower or 'not found' in log_lower):
         info['error_type'] = 'mixin_error'
-    elif 'ClassNotFoundException' in log or 'NoClassDefFoundError' in log:
-        info['error_type'] = 'class_not_found'
-    elif 'is a Fabric mod and cannot be loaded' in log_lower:
-        info['error_type'] = 'fabric_mod_on_neoforge'
-    elif 'is not installed' in log or 'Missing' in log or 'requires' in log:
-        info['error_type'] = 'dependency_or_loading'
-    elif 'conflict' in log_lower or 'incompatible' in log_lower:
-        info['error_type'] = 'mod_conflict'
-    elif 'OutOfMemoryError' in log:
-        info['error_type'] = 'memory'
-    elif 'IllegalArgumentException' in log or 'NullPointerException' in log or 'RuntimeException' in log:
-        info['error_type'] = 'runtime_error'
     else:
         info['error_type'] = 'unknown'
+        for error_type, markers, lowercase in _ERROR_TYPE_MARKERS:
+            haystack = log_lower if lowercase else log
+            if any(marker in haystack for marker in markers):
+                info['error_type'] = error_type
+                break
     
     return info
 
@@ -294,36 +332,20 @@ def sanitize_game_log(game_log: str, max_length: int = 10000) -> str:
     if not game_log:
         return ''
     
-    lines = game_log.split('\n')
-    
-    # Удаляем PII (пути)
-    sanitized_lines = []
-    for line in lines:
-        line = re.sub(r'[A-Z]:\\Users\\[^\\]+', '[USER_PATH]', line)
-        line = re.sub(r'/home/[^/]+', '[USER_PATH]', line)
-        sanitized_lines.append(line)
-    
-    # Важные ключевые слова для сохранения (ошибки, предупреждения, проблемы)
-    important_keywords = [
-        'ERROR', 'WARN', 'FATAL', 'CRASH',
-        'Exception', 'Error', 'Failed',
-        'ClassNotFoundException', 'NoClassDefFoundError',
-        'Mixin', '@Mixin', 'target.*was not found',
-        'is a Fabric mod and cannot be loaded',
-        'Skipping jar',
-        'Connector', 'connectorextras',
-        'Mod loading issue', 'Failure message',
-        'requires', 'not installed', 'Missing',
-        'incompatible', 'conflict',
-        'ModLauncher', 'Mod List:'
-    ]
+    # Удаляем PII (пути) - сразу по всему логу
+    sanitized = game_log
+    for pattern in _GAME_PATH_RES:
+        sanitized = pattern.sub('[USER_PATH]', sanitized)
+    
+    sanitized_lines = sanitized.split('\n')
+    # lower() один раз на весь буфер (индексы строк совпадают с sanitized_lines)
+    lower_lines = sanitized.lower().split('\n')
     
     # Фильтруем важные строки
     important_lines = []
-    for line in sanitized_lines:
-        line_lower = line.lower()
+    for line, line_lower in zip(sanitized_lines, lower_lines):
         # Сохраняем строки с ошибками/предупреждениями
-        if any(keyword.lower() in line_lower for keyword in important_keywords):
+        if any(keyword in line_lower for keyword in _GAME_KEYWORDS_LC):
             important_lines.append(line)
         # Сохраняем строки с модами
         elif 'mod' in line_lower and ('found' in line_lower or 'loading' in line_lower):
@@ -337,9 +359,7 @@ def sanitize_game_log(game_log: str, max_length: int = 10000) -> str:
     
     if len(sanitized_log) > max_length:
         # Берем начало (где обычно ошибки) и конец
-        head = sanitized_log[:max_length // 2]
-        tail = sanitized_log[-max_length // 2:]
-        sanitized_log = head + '\n... [TRUNCATED] ...\n' + tail
+        sanitized_log = _truncate_middle(sanitized_log, max_length)
     
     return sanitized_log
 
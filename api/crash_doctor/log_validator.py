@@ -8,6 +8,32 @@ from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 
 
+_DATE = r'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+_TIME = r'(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2})'
+
+# Паттерны даты крашлога в порядке приоритета
+_DATE_PATTERNS = [
+    re.compile(r'Time:\s*' + _DATE + r'\s+' + _TIME),
+    re.compile(r'Time:\s*' + _DATE),
+    re.compile(r'Crash Report.*?' + _DATE),
+    re.compile(_DATE + r'\s+' + _TIME),
+]
+
+# Паттерны mod_id без re.IGNORECASE: применяются к логу, заранее приведённому к нижнему регистру
+_MOD_ID_PATTERNS = [
+    re.compile(r'\(([a-z0-9_-]+)\)'),               # (mod_id) в скобках
+    re.compile(r'^([a-z0-9_-]+)\s', re.MULTILINE),   # mod_id в начале строки
+    re.compile(r'\s([a-z0-9_-]+)$', re.MULTILINE),   # mod_id в конце строки
+]
+_MOD_LOADING_RE = re.compile(r'mod loading issue for:\s*\[?([a-z0-9_-]+)\]?')
+_MOD_MENTION_PATTERNS = [
+    re.compile(r'mod\s+([a-z0-9_-]+)\s+requires'),
+    re.compile(r'([a-z0-9_-]+)\s+requires'),
+    re.compile(r'mod\s+([a-z0-9_-]+)\s+is\s+not'),
+    re.compile(r'([a-z0-9_-]+)\s+is\s+not\s+installed'),
+]
+
+
 def extract_mods_from_crash_log(crash_log: str, game_log: Optional[str] = None) -> List[str]:
     """
     Извлекает список модов из crash_log или game_log
@@ -25,36 +51,35 @@ def extract_mods_from_crash_log(crash_log: str, game_log: Optional[str] = None)
     if game_log:
         combined_log += "\n" + game_log
     
+    # Приводим к нижнему регистру один раз - все паттерны ниже без re.IGNORECASE,
+    # mod_id в любом случае сравниваются в нижнем регистре
+    log_lower = combined_log.lower()
+    
     # 1. Извлекаем из "Mod List:" секции
-    mod_list_pattern = r'Mod List:.*?\n(.*?)(?=\n--|\n\n|$)'
-    mod_list_match = re.search(mod_list_pattern, combined_log, re.DOTALL | re.IGNORECASE)
-    if mod_list_match:
-        mod_list_text = mod_list_match.group(1)
+    # Без DOTALL-регулярки: находим заголовок и режем до следующей секции через str.find
+    mod_list_text = None
+    header_idx = log_lower.find('mod list:')
+    if header_idx != -1:
+        start = log_lower.find('\n', header_idx)
+        if start != -1:
+            start += 1
+            # Как '$' в регулярке: конец строки или позиция перед финальным \n
+            end = len(log_lower) - 1 if log_lower.endswith('\n') else len(log_lower)
+            for section_end in (log_lower.find('\n--', start), log_lower.find('\n\n', start)):
+                if section_end != -1 and section_end < end:
+                    end = section_end
+            mod_list_text = log_lower[start:end]
+    if mod_list_text is not None:
         # Формат: "Mod Name Version (mod_id)" или просто "mod_id"
-        mod_id_patterns = [
-            r'\(([a-z0-9_-]+)\)',  # (mod_id) в скобках
-            r'^([a-z0-9_-]+)\s',   # mod_id в начале строки
-            r'\s([a-z0-9_-]+)$',   # mod_id в конце строки
-        ]
-        for pattern in mod_id_patterns:
-            matches = re.findall(pattern, mod_list_text, re.MULTILINE | re.IGNORECASE)
-            mods.update(matches)
+        for pattern in _MOD_ID_PATTERNS:
+            mods.update(pattern.findall(mod_list_text))
     
     # 2. Извлекаем из "Mod loading issue for: [mod_id]"
-    mod_loading_pattern = r'Mod loading issue for:\s*\[?([a-z0-9_-]+)\]?'
-    matches = re.findall(mod_loading_pattern, combined_log, re.IGNORECASE)
-    mods.update(matches)
+    mods.update(_MOD_LOADING_RE.findall(log_lower))
     
     # 3. Извлекаем из упоминаний модов в ошибках (например, "mod X requires Y")
-    mod_mention_patterns = [
-        r'mod\s+([a-z0-9_-]+)\s+requires',
-        r'([a-z0-9_-]+)\s+requires',
-        r'mod\s+([a-z0-9_-]+)\s+is\s+not',
-        r'([a-z0-9_-]+)\s+is\s+not\s+installed',
-    ]
-    for pattern in mod_mention_patterns:
-        matches = re.findall(pattern, combined_log, re.IGNORECASE)
-        mods.update(matches)
+    for pattern in _MOD_MENTION_PATTERNS:
+        mods.update(pattern.findall(log_lower))
     
     return list(mods)
 
@@ -97,25 +122,17 @@ def extract_crash_log_date(crash_log: str) -> Optional[datetime]:
     Returns:
         datetime или None если дата не найдена
     """
-    date_patterns = [
-        r'Time:\s*(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})',
-        r'Time:\s*(\d{4}-\d{2}-\d{2})',
-        r'Crash Report.*?(\d{4}-\d{2}-\d{2})',
-        r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})',
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, crash_log)
+    for pattern in _DATE_PATTERNS:
+        match = pattern.search(crash_log)
         if match:
-            date_str = match.group(1)
+            parts = match.groupdict()
             try:
-                # Пробуем разные форматы
-                for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-                    try:
-                        return datetime.strptime(date_str, fmt)
-                    except ValueError:
-                        continue
-            except Exception:
+                # Собираем datetime из чисел напрямую (без strptime)
+                return datetime(
+                    int(parts['year']), int(parts['month']), int(parts['day']),
+                    int(parts.get('hour') or 0), int(parts.get('minute') or 0), int(parts.get('second') or 0)
+                )
+            except ValueError:
                 continue
     
     return None
@@ -142,18 +159,19 @@ def validate_mods_match(
         - warning_message: Сообщение об устаревшем логе (если есть)
         - warning_hash: Хеш для отслеживания повторений
     """
+    # Сначала дешёвая проверка: моды из board_state.
+    # Если их нет - валидация бессмысленна, многомегабайтный лог даже не сканируем
+    board_mods = extract_mods_from_board_state(board_state)
+    if not board_mods:
+        # Если на доске нет модов - пропускаем валидацию
+        return (True, None, None)
+    
     # Извлекаем моды из crash_log
     crash_mods = extract_mods_from_crash_log(crash_log, game_log)
     if not crash_mods:
         # Если не удалось извлечь моды из лога - пропускаем валидацию
         return (True, None, None)
     
-    # Извлекаем моды из board_state
-    board_mods = extract_mods_from_board_state(board_state)
-    if not board_mods:
-        # Если на доске нет модов - пропускаем валидацию
-        return (True, None, None)
-    
     # Нормализуем для сравнения (lowercase)
     crash_mods_lower = {mod.lower() for mod in crash_mods}
     board_mods_lower = {mod.lower() for mod in board_mods}
@@ -3,11 +3,16 @@ Crash Doctor Recorder
 Сохраняет каждую сессию анализа крашлогов в БД для базы решений
 """
 
-import requests
+import logging
 import json
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from supabase_http import SESSION
+
+
+logger = logging.getLogger(__name__)
+
 
 def save_crash_doctor_session(
     user_id: str,
@@ -68,7 +73,7 @@ def save_crash_doctor_session(
     
     try:
         url = f"{supabase_url}/rest/v1/crash_doctor_sessions"
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = SESSION.post(url, headers=headers, json=data, timeout=30)
         response.raise_for_status()
         
         result = response.json()
@@ -77,13 +82,11 @@ def save_crash_doctor_session(
         # Форматируем ID с ведущими нулями (7 цифр, как в других таблицах)
         formatted_id = str(session_id).zfill(7)
         
-        print(f"📝 [Crash Doctor Recorder] Saved session: {formatted_id}")
+        logger.info("📝 [Crash Doctor Recorder] Saved session: %s", formatted_id)
         return formatted_id
         
     except Exception as e:
-        print(f"⚠️  [Crash Doctor Recorder] Failed to save: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️  [Crash Doctor Recorder] Failed to save: %s", e)
         return None
 
 
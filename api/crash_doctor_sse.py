@@ -5,12 +5,47 @@ SSE Streaming версия crash-doctor endpoint
 
 import time
 import json
+import logging
+import queue
 import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from crash_doctor.log_cache import get_log_cache
 from crash_doctor.log_validator import validate_mods_match
 from crash_doctor_recorder import save_crash_doctor_session
 
 
+logger = logging.getLogger(__name__)
+
+# Интервал keepalive-комментариев для Cloudflare/QUIC (секунды)
+HEARTBEAT_INTERVAL = 10
+
+# Сколько ждать сохранения сессии перед complete (секунды) - как timeout самого POST
+SESSION_SAVE_TIMEOUT = 30
+
+# Сохранение сессии идёт параллельно с обновлением rate limiter (обе записи - до complete)
+_PERSIST_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='crash-doctor-persist')
+
+
+def send_sse(event_type, data_dict):
+    """Форматирует SSE событие (компактный JSON - без пробелов после разделителей)"""
+    event_data = json.dumps(data_dict, separators=(',', ':'))
+    return f"event: {event_type}\ndata: {event_data}\n\n"
+
+
+# Статичные события сериализуются один раз при импорте
+HEARTBEAT_FRAME = ": heartbeat\n\n"
+_PROGRESS_VALIDATION = send_sse('progress', {'stage': 'validation', 'message': 'Validating crash log...', 'percent': 5})
+_PROGRESS_SANITIZATION = send_sse('progress', {'stage': 'sanitization', 'message': 'Cleaning crash log...', 'percent': 15})
+_PROGRESS_ANALYSIS = send_sse('progress', {'stage': 'analysis', 'message': 'AI is analyzing crash (may take 30-60 seconds)...', 'percent': 30})
+_PROGRESS_PLANNING = send_sse('progress', {'stage': 'planning', 'message': 'Planning fixes...', 'percent': 70})
+_PROGRESS_FINALIZING = send_sse('progress', {'stage': 'finalizing', 'message': 'Creating fixed board state...', 'percent': 90})
+
+
+def send_heartbeat():
+    """Keepalive для Cloudflare (SSE-комментарий, тело не важно - достаточно самого кадра)"""
+    return HEARTBEAT_FRAME
+
+
 def analyze_crash_with_sse(
     data, user_id, DEEPSEEK_API_KEY, SUPABASE_URL, SUPABASE_KEY,
     analyze_and_fix_crash
@@ -28,24 +63,15 @@ def analyze_crash_with_sse(
     
     События:
     - progress: {stage, message, percent}
-    - complete: {suggestions, patched_board_state, confidence}
+    - suggestion: {action, target_mod, reason, ...} (по одному, как только fix plan готов)
+    - complete: {suggestions, patched_board_state, confidence, session_id}
     - error: {error, message}
     """
     try:
         start_time = time.time()
-        last_heartbeat = time.time()
-        
-        def send_sse(event_type, data_dict):
-            """Форматирует SSE событие"""
-            event_data = json.dumps(data_dict)
-            return f"event: {event_type}\ndata: {event_data}\n\n"
-        
-        def send_heartbeat():
-            """Keepalive для Cloudflare"""
-            return f": heartbeat {int(time.time())}\n\n"
         
         # Валидация
-        yield send_sse('progress', {'stage': 'validation', 'message': 'Validating crash log...', 'percent': 5})
+        yield _PROGRESS_VALIDATION
         
         if not data or 'crash_log' not in data or 'board_state' not in data:
             yield send_sse('error', {'error': 'Invalid request', 'message': 'crash_log and board_state are required'})
@@ -67,7 +93,7 @@ def analyze_crash_with_sse(
         )
         
         if not is_valid and warning_message:
-            print(f"⚠️  [CRASH DOCTOR] Mod mismatch detected: {warning_message[:100]}...")
+            logger.warning("⚠️  [CRASH DOCTOR] Mod mismatch detected: %s...", warning_message[:100])
             yield send_sse('error', {
                 'error': 'Outdated crash log',
                 'message': warning_message,
@@ -84,27 +110,29 @@ def analyze_crash_with_sse(
             is_duplicate, log_hash = log_cache.check_and_mark(user_id, crash_log, game_log)
             
             if is_duplicate:
-                print(f"ℹ️  [CRASH DOCTOR] Duplicate log detected (hash: {log_hash[:8]}...), but proceeding anyway")
+                logger.info("ℹ️  [CRASH DOCTOR] Duplicate log detected (hash: %s...), but proceeding anyway", log_hash[:8])
         
-        print(f"\n{'='*80}")
-        print(f"[CRASH DOCTOR] Starting crash analysis...")
-        print(f"   Crash log size: {len(crash_log)} chars")
-        print(f"   Board mods: {len(board_state.get('mods', []))}")
-        print(f"   Version: {mc_version}, Loader: {mod_loader}")
-        print(f"{'='*80}\n")
+        logger.info("=" * 80)
+        logger.info("[CRASH DOCTOR] Starting crash analysis...")
+        logger.info("   Crash log size: %s chars", len(crash_log))
+        logger.info("   Board mods: %s", len(board_state.get('mods', [])))
+        logger.info("   Version: %s, Loader: %s", mc_version, mod_loader)
+        logger.info("=" * 80)
         
         # Sanitization
-        yield send_sse('progress', {'stage': 'sanitization', 'message': 'Cleaning crash log...', 'percent': 15})
-        yield send_heartbeat()
+        # progress + heartbeat одним чанком
+        yield _PROGRESS_SANITIZATION + HEARTBEAT_FRAME
         
         # Analysis (долгая операция - DeepSeek) с heartbeat
-        yield send_sse('progress', {'stage': 'analysis', 'message': 'AI is analyzing crash (may take 30-60 seconds)...', 'percent': 30})
+        yield _PROGRESS_ANALYSIS
         
-        print("[CRASH DOCTOR] 🤖 Calling analyze_and_fix_crash...")
-        print("[CRASH DOCTOR] ⏰ Starting heartbeat thread to keep QUIC connection alive...")
+        logger.info("[CRASH DOCTOR] 🤖 Calling analyze_and_fix_crash...")
+        logger.info("[CRASH DOCTOR] ⏰ Starting heartbeat thread to keep QUIC connection alive...")
         
         # Run analyze_and_fix_crash in thread while sending heartbeats
+        # Поток кладёт в events_queue готовые suggestions, а в конце - ('done', None)
         result_container = {'result': None, 'exception': None}
+        events_queue = queue.Queue()
         
         def run_analysis():
             try:
@@ -114,96 +142,90 @@ def analyze_crash_with_sse(
                     game_log=game_log,
                     mc_version=mc_version,
                     mod_loader=mod_loader,
-                    deepseek_key=DEEPSEEK_API_KEY
+                    deepseek_key=DEEPSEEK_API_KEY,
+                    on_suggestion=lambda suggestion: events_queue.put(('suggestion', suggestion))
                 )
             except Exception as e:
                 result_container['exception'] = e
+            finally:
+                # Сигнал о завершении - всегда, иначе генератор ждал бы вечно.
+                # put() после записи в result_container - результат виден генератору без join()
+                events_queue.put(('done', None))
         
         analysis_thread = threading.Thread(target=run_analysis, daemon=True)
         analysis_thread.start()
         
-        # Send heartbeats every 15 seconds while analysis is running
-        while analysis_thread.is_alive():
-            time.sleep(15)
-            yield send_heartbeat()
-            last_heartbeat = time.time()
-        
-        # Wait for thread to complete
-        analysis_thread.join(timeout=1)
+        # Heartbeat каждые HEARTBEAT_INTERVAL секунд, пока идёт анализ;
+        # suggestions отдаём клиенту по мере готовности, выходим сразу по завершении потока
+        while True:
+            try:
+                event_type, payload = events_queue.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield HEARTBEAT_FRAME
+                continue
+            
+            if event_type == 'done':
+                break
+            yield send_sse(event_type, payload)
         
         if result_container['exception']:
             raise result_container['exception']
         
         result = result_container['result']
         
-        yield send_heartbeat()
+        yield HEARTBEAT_FRAME
         
         if not result.get('success'):
             error_msg = result.get('error', 'Analysis failed')
-            print(f"❌ [CRASH DOCTOR] Analysis failed: {error_msg}")
+            logger.error("❌ [CRASH DOCTOR] Analysis failed: %s", error_msg)
             # НЕ помечаем как успешный - можно повторить попытку
             yield send_sse('error', {'error': 'Analysis failed', 'message': error_msg})
             return
         
         # Planning fixes
-        yield send_sse('progress', {'stage': 'planning', 'message': 'Planning fixes...', 'percent': 70})
-        yield send_heartbeat()
+        yield _PROGRESS_PLANNING + HEARTBEAT_FRAME
         
         # Finalizing
-        yield send_sse('progress', {'stage': 'finalizing', 'message': 'Creating fixed board state...', 'percent': 90})
+        yield _PROGRESS_FINALIZING
         
         total_time = time.time() - start_time
         
-        print(f"\n[CRASH DOCTOR] ✅ Analysis complete in {total_time:.1f}s")
-        print(f"   Confidence: {result.get('confidence', 0.0):.2f}")
-        print(f"   Suggestions: {len(result.get('suggestions', []))}")
+        logger.info("[CRASH DOCTOR] ✅ Analysis complete in %.1fs", total_time)
+        logger.info("   Confidence: %.2f", result.get('confidence', 0.0))
+        logger.info("   Suggestions: %s", len(result.get('suggestions', [])))
         
-        # Increment rate limiter usage после успешного анализа
-        if user_id:
-            try:
-                from rate_limiter import get_rate_limiter
-                rate_limiter = get_rate_limiter(SUPABASE_URL, SUPABASE_KEY)
-                # Получаем количество токенов из результата
-                token_usage = result.get('token_usage', {})
-                total_tokens = token_usage.get('total_tokens', 0)
-                rate_limiter.increment_usage(user_id, tokens_used=total_tokens)
-                print(f"   📊 Rate limiter updated: {total_tokens} tokens")
-            except Exception as e:
-                print(f"   ⚠️  Failed to update rate limiter: {e}")
-        
-        # Сохраняем сессию в БД
         session_id = None
         if user_id:
+            # Сессия пишется в фоне, пока синхронно обновляется rate limiter:
+            # usage учтён до complete (повторный запрос не проскочит лимит), запросы к БД не суммируются
+            save_future = _PERSIST_EXECUTOR.submit(
+                _save_session,
+                result=result,
+                user_id=user_id,
+                crash_log=crash_log,
+                game_log=game_log,
+                mc_version=mc_version,
+                mod_loader=mod_loader,
+                board_state=board_state,
+                SUPABASE_URL=SUPABASE_URL,
+                SUPABASE_KEY=SUPABASE_KEY
+            )
+            
+            _increment_usage(result, user_id, SUPABASE_URL, SUPABASE_KEY)
+            
             try:
-                session_id = save_crash_doctor_session(
-                    user_id=user_id,
-                    crash_log=crash_log,
-                    game_log=game_log,
-                    mc_version=mc_version,
-                    mod_loader=mod_loader,
-                    root_cause=result.get('root_cause', ''),
-                    confidence=result.get('confidence', 0.0),
-                    suggestions=result.get('suggestions', []),
-                    warnings=result.get('warnings', []),
-                    board_state=board_state,
-                    supabase_url=SUPABASE_URL,
-                    supabase_key=SUPABASE_KEY
-                )
-                if session_id:
-                    print(f"   💾 Session saved to DB: {session_id}")
-            except Exception as e:
-                print(f"   ⚠️  Failed to save session to DB: {e}")
-                import traceback
-                traceback.print_exc()
+                session_id = save_future.result(timeout=SESSION_SAVE_TIMEOUT)
+            except FutureTimeoutError:
+                logger.warning("   ⚠️  Session save is taking longer than %ss, completing without session_id", SESSION_SAVE_TIMEOUT)
         
         # Помечаем лог как успешно обработанный (только после успешного анализа)
         if user_id and log_hash:
             try:
                 log_cache = get_log_cache()
                 log_cache.mark_as_success(user_id, log_hash)
-                print(f"   ✅ Log marked as successfully processed (hash: {log_hash[:8]}...)")
+                logger.info("   ✅ Log marked as successfully processed (hash: %s...)", log_hash[:8])
             except Exception as e:
-                print(f"   ⚠️  Failed to mark log as success: {e}")
+                logger.warning("   ⚠️  Failed to mark log as success: %s", e)
         
         # Complete!
         yield send_sse('complete', {
@@ -219,12 +241,56 @@ def analyze_crash_with_sse(
         })
         
     except Exception as e:
-        print(f"❌ [CRASH DOCTOR SSE] Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [CRASH DOCTOR SSE] Error: %s", e)
         
         yield send_sse('error', {
             'error': 'Internal server error',
             'message': str(e)
         })
 
+
+def _increment_usage(result, user_id, SUPABASE_URL, SUPABASE_KEY):
+    """Increment rate limiter usage после успешного анализа"""
+    try:
+        from rate_limiter import get_rate_limiter
+        rate_limiter = get_rate_limiter(SUPABASE_URL, SUPABASE_KEY)
+        # Получаем количество токенов из результата
+        token_usage = result.get('token_usage', {})
+        total_tokens = token_usage.get('total_tokens', 0)
+        rate_limiter.increment_usage(user_id, tokens_used=total_tokens)
+        logger.info("   📊 Rate limiter updated: %s tokens", total_tokens)
+    except Exception as e:
+        logger.warning("   ⚠️  Failed to update rate limiter: %s", e)
+
+
+def _save_session(
+    result, user_id, crash_log, game_log, mc_version, mod_loader,
+    board_state, SUPABASE_URL, SUPABASE_KEY
+):
+    """
+    Сохраняет сессию в БД (выполняется в _PERSIST_EXECUTOR)
+    
+    Returns:
+        ID сохранённой сессии или None
+    """
+    try:
+        session_id = save_crash_doctor_session(
+            user_id=user_id,
+            crash_log=crash_log,
+            game_log=game_log,
+            mc_version=mc_version,
+            mod_loader=mod_loader,
+            root_cause=result.get('root_cause', ''),
+            confidence=result.get('confidence', 0.0),
+            suggestions=result.get('suggestions', []),
+            warnings=result.get('warnings', []),
+            board_state=board_state,
+            supabase_url=SUPABASE_URL,
+            supabase_key=SUPABASE_KEY
+        )
+        if session_id:
+            logger.info("   💾 Session saved to DB: %s", session_id)
+        return session_id
+    except Exception as e:
+        logger.exception("   ⚠️  Failed to save session to DB: %s", e)
+        return None
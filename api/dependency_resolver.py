@@ -3,8 +3,261 @@ Dependency Resolver
 Автоматически резолвит и добавляет required dependencies для модов
 """
 
-import json
-from typing import List, Dict, Set
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List, Dict, Optional, Set
+
+from supabase_http import fetch_mods_by_source_ids, json_loads
+
+
+logger = logging.getLogger(__name__)
+
+# Forgified Fabric API - отсекается вместе с зависимыми модами, если fabric compat mode выключен
+FFAPI_SOURCE_ID = 'Aqlf1Shp'
+
+# Процессный кэш строк модов из БД: популярные зависимости (Fabric API, Cloth Config...)
+# запрашиваются почти каждой сборкой. Ключ - (supabase_url, source_id), TTL + LRU-лимит
+MOD_CACHE_TTL = 300  # секунд
+MOD_CACHE_MAXSIZE = 10000
+_MOD_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (timestamp, mod)
+_mod_cache_lock = threading.Lock()
+
+
+def fetch_mods_batch(source_ids: List[str], supabase_url: str, supabase_key: str) -> Dict[str, Dict]:
+    """
+    Фетчит несколько модов из БД
+    
+    Моды из процессного кэша (_MOD_CACHE) не запрашиваются повторно.
+    Остальные запрашиваются через fetch_mods_by_source_ids (чанки in.(...) параллельно)
+    
+    Returns:
+        Dict source_id -> mod (каждый вызов получает свои копии - резолвер их мутирует)
+    """
+    if not source_ids:
+        return {}
+    
+    mods_map = {}
+    missing_ids = []
+    now = time.monotonic()
+    with _mod_cache_lock:
+        for source_id in source_ids:
+            key = (supabase_url, source_id)
+            entry = _MOD_CACHE.get(key)
+            if entry is not None and now - entry[0] < MOD_CACHE_TTL:
+                _MOD_CACHE.move_to_end(key)
+                mods_map[source_id] = dict(entry[1])
+            else:
+                missing_ids.append(source_id)
+    
+    if not missing_ids:
+        return mods_map
+    
+    rows_by_id, _ = fetch_mods_by_source_ids(missing_ids, supabase_url, supabase_key)
+    # Mapping source_id -> mod с уже распарсенными JSON-полями
+    fetched = {source_id: _normalize_mod(row) for source_id, row in rows_by_id.items()}
+    
+    with _mod_cache_lock:
+        for source_id, mod in fetched.items():
+            key = (supabase_url, source_id)
+            _MOD_CACHE[key] = (now, dict(mod))
+            _MOD_CACHE.move_to_end(key)
+        while len(_MOD_CACHE) > MOD_CACHE_MAXSIZE:
+            _MOD_CACHE.popitem(last=False)
+    
+    mods_map.update(fetched)
+    return mods_map
+
+
+def invalidate_mod_cache(source_id: str = None) -> int:
+    """
+    Сбрасывает кэш модов (например после обновления мода в БД)
+    
+    Args:
+        source_id: source_id мода; None - очистить весь кэш
+    
+    Returns:
+        Количество удалённых записей
+    """
+    with _mod_cache_lock:
+        if source_id is None:
+            removed = len(_MOD_CACHE)
+            _MOD_CACHE.clear()
+            return removed
+        
+        keys = [key for key in _MOD_CACHE if key[1] == source_id]
+        for key in keys:
+            del _MOD_CACHE[key]
+        return len(keys)
+
+
+def _normalize_mod(mod: Dict) -> Dict:
+    """
+    Возвращает копию мода с dependencies/incompatibilities, приведёнными к dict
+    
+    В БД поля могут прийти JSON-строкой или null - после нормализации
+    всегда dict, и дальше по коду их больше не нужно парсить.
+    Исходный dict не меняется: моды вызывающего кода остаются как были.
+    """
+    mod = dict(mod)
+    for key in ('dependencies', 'incompatibilities'):
+        value = mod.get(key)
+        if isinstance(value, str):
+            try:
+                value = json_loads(value)
+            except ValueError:
+                value = {}
+        if not isinstance(value, dict):
+            value = {}
+        mod[key] = value
+    return mod
+
+
+def _version_matches(mc_version: str, versions_index: tuple, mc_prefixes: tuple = None) -> bool:
+    """
+    Совпадает ли версия MC с одной из версий зависимости по префиксу в любую сторону
+    (эквивалент any(mc_version.startswith(v) or v.startswith(mc_version) for v in versions))
+    
+    versions_index: (frozenset версий, отсортированный tuple версий)
+    mc_prefixes: все префиксы mc_version (включая '' и саму версию) - можно посчитать один раз на резолв
+    """
+    versions_set, versions_sorted = versions_index
+    
+    # Версия зависимости - префикс mc_version (включая точное совпадение):
+    # префиксов у mc_version не больше len + 1, проверяем их по set
+    if mc_prefixes is None:
+        mc_prefixes = tuple(mc_version[:end] for end in range(len(mc_version) + 1))
+    if not versions_set.isdisjoint(mc_prefixes):
+        return True
+    
+    # mc_version - префикс версии зависимости: такие версии идут в sorted подряд
+    # начиная с bisect_left, достаточно проверить первую
+    i = bisect_left(versions_sorted, mc_version)
+    return i < len(versions_sorted) and versions_sorted[i].startswith(mc_version)
+
+
+def _find_dependency_cycles(mods: List[Dict]) -> List[List[str]]:
+    """
+    Ищет циклы required-зависимостей среди модов (итеративный Tarjan SCC)
+    
+    Резолвер на циклах не зацикливается (каждый мод обрабатывается один раз),
+    но цикл в данных - почти всегда ошибка в БД, и его стоит показать в логах.
+    
+    Returns:
+        Список циклов - каждый как список source_id (SCC из >1 мода или self-loop)
+    """
+    graph = {}
+    for mod in mods:
+        source_id = mod.get('source_id')
+        if source_id:
+            graph[source_id] = [
+                dep_id for dep_id, dep_info in mod['dependencies'].items()
+                if dep_info.get('type') == 'required'
+            ]
+    
+    index_of: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    cycles = []
+    counter = 0
+    
+    for root in graph:
+        if root in index_of:
+            continue
+        
+        # Стек обхода: (вершина, итератор по её рёбрам) - без рекурсии
+        work = [(root, iter(graph[root]))]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        
+        while work:
+            node, edges = work[-1]
+            pushed = False
+            for dep_id in edges:
+                if dep_id not in graph:
+                    continue
+                if dep_id not in index_of:
+                    index_of[dep_id] = lowlink[dep_id] = counter
+                    counter += 1
+                    stack.append(dep_id)
+                    on_stack.add(dep_id)
+                    work.append((dep_id, iter(graph[dep_id])))
+                    pushed = True
+                    break
+                if dep_id in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[dep_id])
+            
+            if pushed:
+                continue
+            
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in graph[node]:
+                    cycles.append(component[::-1])
+    
+    return cycles
+
+
+class _IncompatIndex:
+    """
+    Инвертированный индекс несовместимостей для набора уже принятых модов
+    
+    Вместо полного прохода по всем принятым модам для каждого кандидата
+    смотрим только тех, кто реально связан с ним несовместимостью:
+    прямую (кандидат объявляет несовместимость) и обратную (объявили его).
+    Порядок кандидатов сохраняет порядок добавления - как при проходе по списку.
+    """
+    
+    def __init__(self, mods: List[Dict] = ()):
+        self._seq = 0
+        self._by_id: Dict[str, List[tuple]] = {}    # source_id -> [(seq, mod)]
+        self._reverse: Dict[str, List[tuple]] = {}  # target_id -> [(seq, mod)] объявивших несовместимость с ним
+        for mod in mods:
+            self.add(mod)
+    
+    def add(self, mod: Dict):
+        self._seq += 1
+        entry = (self._seq, mod)
+        source_id = mod.get('source_id')
+        if source_id:
+            self._by_id.setdefault(source_id, []).append(entry)
+        for target_id in mod['incompatibilities']:
+            self._reverse.setdefault(target_id, []).append(entry)
+    
+    def candidates(self, mod: Dict) -> List[Dict]:
+        """Принятые моды, связанные с mod несовместимостью (в любую сторону), в порядке добавления"""
+        incompats = mod['incompatibilities']
+        source_id = mod.get('source_id')
+        reverse = self._reverse.get(source_id, ()) if source_id else ()
+        
+        # Быстрый путь: у мода нет несовместимостей и никто не объявил несовместимость с ним
+        # (большинство библиотек - Fabric API, Cloth Config...)
+        if not incompats:
+            return [existing for _, existing in reverse]
+        
+        found = {}
+        for target_id in incompats:
+            for seq, existing in self._by_id.get(target_id, ()):
+                found[seq] = existing
+        for seq, existing in reverse:
+            found[seq] = existing
+        return [found[seq] for seq in sorted(found)]
 
 
 def resolve_dependencies(
@@ -30,45 +283,53 @@ def resolve_dependencies(
     Returns:
         Список модов с добавленными dependencies (без лимита)
     """
-    import requests
+    logger.info("=" * 80)
+    logger.info("🔗 [Dependency Resolver] Resolving required dependencies...")
+    logger.info("=" * 80)
     
-    print("=" * 80)
-    print("🔗 [Dependency Resolver] Resolving required dependencies...")
-    print("=" * 80)
+    # Парсим JSON-поля всех выбранных модов один раз - в копиях, входной список не меняется
+    selected_mods = [_normalize_mod(mod) for mod in selected_mods]
     
     # Собираем source_id всех уже выбранных модов
     selected_source_ids = {mod.get('source_id') for mod in selected_mods if mod.get('source_id')}
     
+    # Lowercase loader'а и списков loaders считаем один раз.
+    # Ключ кэша - id() списка: все списки живут в модах до конца вызова
+    mod_loader_lc = mod_loader.lower()
+    loaders_lc_cache: Dict[int, frozenset] = {}
+    
+    def loaders_lc(loaders: List[str]) -> frozenset:
+        cached = loaders_lc_cache.get(id(loaders))
+        if cached is None:
+            cached = loaders_lc_cache[id(loaders)] = frozenset(l.lower() for l in loaders)
+        return cached
+    
+    # Индексы списков versions зависимостей для _version_matches (тот же ключ - id() списка)
+    version_index_cache: Dict[int, tuple] = {}
+    
+    def version_index(versions: List[str]) -> tuple:
+        cached = version_index_cache.get(id(versions))
+        if cached is None:
+            str_versions = [v for v in versions if isinstance(v, str)]
+            cached = version_index_cache[id(versions)] = (frozenset(str_versions), tuple(sorted(str_versions)))
+        return cached
+    
+    # Fabric Compatibility моды отсекаются только при выключенном режиме - set для O(1) проверки
+    skip_fabric_fix_ids = frozenset(fabric_fix_ids) if (fabric_fix_ids and not fabric_compat_mode) else frozenset()
+    
+    # mc_version постоянна на весь резолв - её префиксы считаем один раз
+    mc_prefixes = tuple(mc_version[:end] for end in range(len(mc_version) + 1))
+    
+    def mc_version_ok(dep_versions: List[str]) -> bool:
+        """Подходит ли зависимость под mc_version (пустой список versions - подходит)"""
+        if not dep_versions or mc_version in dep_versions:
+            return True
+        return _version_matches(mc_version, version_index(dep_versions), mc_prefixes)
+    
     dependencies_to_add = []
+    dependencies_by_id: Dict[str, Dict] = {}  # source_id -> мод из dependencies_to_add для O(1) поиска
     processed_mods = set()  # Чтобы не обрабатывать один мод дважды
     
-    def fetch_mods_batch(source_ids: List[str]) -> Dict[str, Dict]:
-        """Фетчит несколько модов из БД за один запрос"""
-        if not source_ids:
-            return {}
-        
-        try:
-            # Supabase PostgREST поддерживает фильтр 'in'
-            ids_filter = ','.join(source_ids)
-            response = requests.get(
-                f'{supabase_url}/rest/v1/mods',
-                params={'source_id': f'in.({ids_filter})', 'select': '*'},
-                headers={
-                    'apikey': supabase_key,
-                    'Authorization': f'Bearer {supabase_key}'
-                },
-                timeout=15
-            )
-            
-            if response.status_code == 200:
-                mods = response.json()
-                # Создаём mapping source_id -> mod
-                return {mod['source_id']: mod for mod in mods if mod.get('source_id')}
-        except Exception as e:
-            print(f"   ⚠️  Failed to batch fetch mods: {e}")
-        
-        return {}
-    
     def is_mod_compatible_with_loader(mod: Dict) -> tuple[bool, str]:
         """
         Проверяет, совместим ли мод с текущим loader'ом
@@ -81,523 +342,420 @@ def resolve_dependencies(
             return (True, '')
         
         # Проверяем наличие текущего loader'а
-        if mod_loader.lower() not in [l.lower() for l in mod_loaders]:
+        if mod_loader_lc not in loaders_lc(mod_loaders):
             available_loaders = ', '.join(mod_loaders)
             return (False, f"Not available for {mod_loader} (only for: {available_loaders})")
         
         return (True, '')
     
-    def check_incompatibilities(mod_to_check: Dict, existing_mods: List[Dict]) -> tuple[bool, str]:
+    def check_incompatibilities(mod_to_check: Dict, existing_index: _IncompatIndex) -> tuple[bool, str, Optional[Dict]]:
         """
         Проверяет несовместимости мода с уже выбранными (ДВУНАПРАВЛЕННО)
         Учитывает loader-специфичные несовместимости
-        Returns: (is_compatible, reason)
+        Returns: (is_compatible, reason, мод, с которым найдена несовместимость - или None)
         """
         mod_source_id = mod_to_check.get('source_id')
-        mod_incompats = mod_to_check.get('incompatibilities', {})
+        mod_incompats = mod_to_check['incompatibilities']
         
-        # Защита от None/null
-        if mod_incompats is None:
-            mod_incompats = {}
-        
-        # Если incompatibilities это строка JSON - парсим
-        if isinstance(mod_incompats, str):
-            try:
-                mod_incompats = json.loads(mod_incompats)
-            except:
-                mod_incompats = {}
-        
-        # Проверяем все уже выбранные моды
-        for existing_mod in existing_mods:
+        # Проверяем только выбранные моды, связанные с этим несовместимостью
+        for existing_mod in existing_index.candidates(mod_to_check):
             existing_id = existing_mod.get('source_id')
             
             # ПРОВЕРКА 1: Проверяем, есть ли у mod_to_check несовместимость с existing_mod
-            if mod_incompats and isinstance(mod_incompats, dict) and existing_id and existing_id in mod_incompats:
+            if existing_id and existing_id in mod_incompats:
                 incompat_info = mod_incompats[existing_id]
                 
                 # Проверяем loader-специфичность
                 incompat_loaders = incompat_info.get('loaders')
                 if incompat_loaders:
                     # Несовместимость только на определенных loader'ах
-                    if mod_loader.lower() not in [l.lower() for l in incompat_loaders]:
+                    if mod_loader_lc not in loaders_lc(incompat_loaders):
                         # Текущий loader не в списке - совместимы!
-                        print(f"        ℹ️  Incompatibility exists but not for {mod_loader} (only for {incompat_loaders})")
+                        logger.debug("        ℹ️  Incompatibility exists but not for %s (only for %s)", mod_loader, incompat_loaders)
                         continue
                 
                 # Несовместимость применяется
                 reason = incompat_info.get('reason', 'Unknown incompatibility')
-                return (False, f"Incompatible with {existing_mod.get('name', existing_id)}: {reason}")
+                return (False, f"Incompatible with {existing_mod.get('name', existing_id)}: {reason}", existing_mod)
             
             # ПРОВЕРКА 2: Проверяем ОБРАТНОЕ - есть ли у existing_mod несовместимость с mod_to_check
-            existing_incompats = existing_mod.get('incompatibilities', {})
-            
-            # Защита от None
-            if existing_incompats is None:
-                existing_incompats = {}
-            
-            if isinstance(existing_incompats, str):
-                try:
-                    existing_incompats = json.loads(existing_incompats)
-                except:
-                    existing_incompats = {}
+            existing_incompats = existing_mod['incompatibilities']
             
-            if existing_incompats and isinstance(existing_incompats, dict) and mod_source_id and mod_source_id in existing_incompats:
+            if mod_source_id and mod_source_id in existing_incompats:
                 incompat_info = existing_incompats[mod_source_id]
                 
                 # Проверяем loader-специфичность
                 incompat_loaders = incompat_info.get('loaders')
                 if incompat_loaders:
-                    if mod_loader.lower() not in [l.lower() for l in incompat_loaders]:
-                        print(f"        ℹ️  Reverse incompatibility exists but not for {mod_loader} (only for {incompat_loaders})")
+                    if mod_loader_lc not in loaders_lc(incompat_loaders):
+                        logger.debug("        ℹ️  Reverse incompatibility exists but not for %s (only for %s)", mod_loader, incompat_loaders)
                         continue
                 
                 # Несовместимость применяется
                 reason = incompat_info.get('reason', 'Unknown incompatibility')
-                return (False, f"{existing_mod.get('name', existing_id)} is incompatible with this mod: {reason}")
+                return (False, f"{existing_mod.get('name', existing_id)} is incompatible with this mod: {reason}", existing_mod)
         
-        return (True, '')
+        return (True, '', None)
     
-    def process_mod_dependencies(mod: Dict, mods_map: Dict[str, Dict], depth: int = 0):
+    def process_mod_dependencies(mod: Dict, mods_map: Dict[str, Dict], depth: int = 0) -> List[Dict]:
         """
-        Рекурсивно обрабатывает dependencies мода
+        Обрабатывает dependencies одного мода (один уровень BFS)
         mods_map: уже загруженные данные модов (source_id -> mod)
-        """
-        if depth > 3:  # Ограничение глубины рекурсии
-            return
         
+        Returns:
+            Список добавленных зависимостей - фронтир следующей волны
+        """
+        added = []
         source_id = mod.get('source_id')
         mod_name = mod.get('name', 'unknown')
         
         if not source_id:
-            return
+            return added
         
         if source_id in processed_mods:
-            return
+            return added
         
         processed_mods.add(source_id)
         if depth == 0:
-            print(f"   🔍 {mod_name}")
+            logger.debug("   🔍 %s", mod_name)
         
         # Получаем dependencies из БД
-        dependencies = mod.get('dependencies', {})
-        
-        # Если dependencies это строка JSON - парсим
-        if isinstance(dependencies, str):
-            try:
-                dependencies = json.loads(dependencies)
-            except:
-                dependencies = {}
+        dependencies = mod['dependencies']
         
-        if not dependencies or not isinstance(dependencies, dict):
-            return
+        if not dependencies:
+            return added
         
         # Обрабатываем каждую зависимость
         for dep_source_id, dep_info in dependencies.items():
             # Пропускаем если уже есть в выбранных
             if dep_source_id in selected_source_ids:
                 if depth == 0:  # Логируем только для первого уровня
-                    print(f"      ⏭️  {dep_source_id[:8]}... already in selected mods")
+                    logger.debug("      ⏭️  %s... already in selected mods", dep_source_id[:8])
                 continue
             
             # Пропускаем если уже добавлен как зависимость
-            if any(d.get('source_id') == dep_source_id for d in dependencies_to_add):
+            if dep_source_id in dependencies_by_id:
                 if depth == 0:  # Логируем только для первого уровня
-                    dep_name = next((d.get('name', dep_source_id) for d in dependencies_to_add if d.get('source_id') == dep_source_id), dep_source_id)
-                    print(f"      ⏭️  {dep_name} already added as dependency")
+                    dep_name = dependencies_by_id[dep_source_id].get('name', dep_source_id)
+                    logger.debug("      ⏭️  %s already added as dependency", dep_name)
                 continue
             
             # Проверяем тип зависимости
             dep_type = dep_info.get('type', 'optional')
             if dep_type != 'required':
                 if depth == 0:  # Логируем только для первого уровня
-                    print(f"      ⏭️  {dep_source_id[:8]}... is optional dependency")
+                    logger.debug("      ⏭️  %s... is optional dependency", dep_source_id[:8])
                 continue
             
             # Проверяем версию MC
             dep_versions = dep_info.get('versions', [])
-            if dep_versions and mc_version not in dep_versions:
-                version_match = any(
-                    mc_version.startswith(v) or v.startswith(mc_version) 
-                    for v in dep_versions
-                )
-                if not version_match:
-                    if depth == 0:  # Логируем только для первого уровня
-                        print(f"      ⏭️  {dep_source_id[:8]}... - version mismatch (required: {dep_versions}, got: {mc_version})")
-                    continue
+            if not mc_version_ok(dep_versions):
+                if depth == 0:  # Логируем только для первого уровня
+                    logger.debug("      ⏭️  %s... - version mismatch (required: %s, got: %s)", dep_source_id[:8], dep_versions, mc_version)
+                continue
             
             # Получаем данные из уже загруженного batch
             dep_mod = mods_map.get(dep_source_id)
             if not dep_mod:
                 if depth == 0:  # Логируем только для первого уровня
                     dep_name = dep_info.get('name', dep_source_id[:8] + '...')
-                    print(f"      ⚠️  Dependency {dep_name} ({dep_source_id[:8]}...) not found in DB")
+                    logger.warning("      ⚠️  Dependency %s (%s...) not found in DB", dep_name, dep_source_id[:8])
                 continue
             
             # ПРОВЕРКА СОВМЕСТИМОСТИ С LOADER'ОМ
             is_loader_ok, loader_reason = is_mod_compatible_with_loader(dep_mod)
             if not is_loader_ok:
                 if depth == 0:  # Логируем только для первого уровня
-                    print(f"      ⏭️  {dep_mod.get('name', dep_source_id)} - {loader_reason}")
+                    logger.debug("      ⏭️  %s - %s", dep_mod.get('name', dep_source_id), loader_reason)
                 continue
             
+            dep_mod_id = dep_mod.get('source_id')
+            
             # ФИЛЬТРАЦИЯ FABRIC COMPATIBILITY МОДОВ
-            if not fabric_compat_mode and fabric_fix_ids:
-                if dep_mod.get('source_id') in fabric_fix_ids:
-                    # Пропускаем Fabric Compatibility моды если режим выключен
-                    if depth == 0:
-                        print(f"      ⏭️  {dep_mod.get('name')} - Fabric Compatibility mod (mode disabled)")
-                    continue
+            if dep_mod_id in skip_fabric_fix_ids:
+                # Пропускаем Fabric Compatibility моды если режим выключен
+                if depth == 0:
+                    logger.debug("      ⏭️  %s - Fabric Compatibility mod (mode disabled)", dep_mod.get('name'))
+                continue
             
             # ФИЛЬТРАЦИЯ FFAPI (Forgified Fabric API)
-            # FFAPI source_id: 'Aqlf1Shp'
             if not fabric_compat_mode:
-                if dep_mod.get('source_id') == 'Aqlf1Shp':
+                if dep_mod_id == FFAPI_SOURCE_ID:
                     # Пропускаем FFAPI если режим выключен
                     if depth == 0:
-                        print(f"      ⏭️  {dep_mod.get('name')} - FFAPI (fabric compat mode disabled)")
+                        logger.debug("      ⏭️  %s - FFAPI (fabric compat mode disabled)", dep_mod.get('name'))
                     continue
             
             # ПРОВЕРКА НЕСОВМЕСТИМОСТИ
-            all_existing = selected_mods + dependencies_to_add
-            is_compatible, incompat_reason = check_incompatibilities(dep_mod, all_existing)
+            is_compatible, incompat_reason, _ = check_incompatibilities(dep_mod, existing_index)
             
             if not is_compatible:
                 if depth == 0:  # Логируем только для первого уровня
-                    print(f"      ⏭️  {dep_mod.get('name')} - {incompat_reason}")
+                    logger.debug("      ⏭️  %s - %s", dep_mod.get('name'), incompat_reason)
                 continue
             
             dep_mod['_added_as_dependency'] = True
             dep_mod['_dependency_of'] = mod.get('name', 'unknown')
             dependencies_to_add.append(dep_mod)
-            dep_name = dep_mod.get('name', 'Unknown')
-            dep_source_id = dep_mod.get('source_id', 'unknown')
-            print(f"      ✅ {dep_name} (source_id: {dep_source_id[:8]}...)")
-            
-            # Рекурсивно обрабатываем зависимости этой зависимости
-            process_mod_dependencies(dep_mod, mods_map, depth + 1)
+            dependencies_by_id.setdefault(dep_source_id, dep_mod)
+            existing_index.add(dep_mod)
+            logger.debug("      ✅ %s (source_id: %s...)", dep_mod.get('name', 'Unknown'), (dep_mod_id or 'unknown')[:8])
+            added.append(dep_mod)
+        
+        return added
     
     # Сначала фильтруем выбранные моды по loader'у и FFAPI зависимостям
-    print("🔍 Filtering selected mods by loader compatibility...")
+    logger.info("🔍 Filtering selected mods by loader compatibility...")
     filtered_selected_mods = []
-    FFAPI_SOURCE_ID = 'Aqlf1Shp'  # Forgified Fabric API
     
     for mod in selected_mods:
         is_loader_ok, loader_reason = is_mod_compatible_with_loader(mod)
         if not is_loader_ok:
-            print(f"   ⏭️  Removed: {mod.get('name')} - {loader_reason}")
+            logger.debug("   ⏭️  Removed: %s - %s", mod.get('name'), loader_reason)
             continue
         
-        # Проверяем, требует ли мод FFAPI как зависимость
-        if not fabric_compat_mode:
-            mod_deps = mod.get('dependencies', {})
-            if isinstance(mod_deps, str):
-                try:
-                    mod_deps = json.loads(mod_deps)
-                except:
-                    mod_deps = {}
-            
-            if isinstance(mod_deps, dict) and FFAPI_SOURCE_ID in mod_deps:
-                dep_info = mod_deps[FFAPI_SOURCE_ID]
-                if dep_info.get('type') == 'required':
-                    print(f"   ⏭️  Removed: {mod.get('name')} - requires FFAPI (fabric compat mode disabled)")
-                    continue
+        # Проверяем, требует ли мод FFAPI как зависимость (dependencies уже нормализованы в dict)
+        if not fabric_compat_mode and mod['dependencies'].get(FFAPI_SOURCE_ID, {}).get('type') == 'required':
+            logger.debug("   ⏭️  Removed: %s - requires FFAPI (fabric compat mode disabled)", mod.get('name'))
+            continue
         
         filtered_selected_mods.append(mod)
     
     if len(filtered_selected_mods) < len(selected_mods):
-        print(f"   ℹ️  Filtered out {len(selected_mods) - len(filtered_selected_mods)} incompatible mods")
-    
-    # Резолвим конфликты по популярности
-    print("🔥 Resolving conflicts by popularity...")
-    resolved_mods = []
+        logger.info("   ℹ️  Filtered out %s incompatible mods", len(selected_mods) - len(filtered_selected_mods))
+    
+    # Резолвим конфликты по популярности: принимаем моды от самых популярных к менее
+    # популярным, конфликтующий с уже принятым мод отсекается. Результат не зависит от
+    # порядка, в котором AI вернул моды, а совместимые между собой моды не теряются
+    logger.info("🔥 Resolving conflicts by popularity...")
+    resolved_index = _IncompatIndex()
+    accepted_ids: Set[int] = set()  # id() принятых модов
     skipped_due_to_conflicts = []
     
-    for mod in filtered_selected_mods:
-        # Проверяем конфликты с уже добавленными
-        is_compatible, reason = check_incompatibilities(mod, resolved_mods)
+    # sorted стабилен: при равных downloads выигрывает мод, который AI выбрал раньше
+    by_popularity = sorted(filtered_selected_mods, key=lambda m: m.get('downloads') or 0, reverse=True)
+    
+    for mod in by_popularity:
+        # Проверяем конфликты с уже принятыми (более популярными)
+        is_compatible, reason, conflicting_mod = check_incompatibilities(mod, resolved_index)
         
-        if not is_compatible:
-            # Нашли конфликт! Сравниваем популярность
-            mod_downloads = mod.get('downloads', 0)
-            
-            # Находим конфликтующий мод
-            conflicting_mod = None
-            for existing in resolved_mods:
-                # Проверяем в обе стороны
-                mod_incompats = mod.get('incompatibilities', {})
-                if isinstance(mod_incompats, str):
-                    try:
-                        mod_incompats = json.loads(mod_incompats)
-                    except:
-                        mod_incompats = {}
-                
-                existing_incompats = existing.get('incompatibilities', {})
-                if isinstance(existing_incompats, str):
-                    try:
-                        existing_incompats = json.loads(existing_incompats)
-                    except:
-                        existing_incompats = {}
-                
-                # Защита от None
-                if not isinstance(mod_incompats, dict):
-                    mod_incompats = {}
-                if not isinstance(existing_incompats, dict):
-                    existing_incompats = {}
-                
-                if (existing.get('source_id') in mod_incompats) or (mod.get('source_id') in existing_incompats):
-                    conflicting_mod = existing
-                    break
-            
-            if conflicting_mod:
-                conflicting_downloads = conflicting_mod.get('downloads', 0)
-                
-                if mod_downloads > conflicting_downloads:
-                    # Новый мод популярнее - заменяем
-                    print(f"   🔄 Replacing {conflicting_mod.get('name')} ({conflicting_downloads:,} downloads) with {mod.get('name')} ({mod_downloads:,} downloads)")
-                    resolved_mods.remove(conflicting_mod)
-                    resolved_mods.append(mod)
-                    skipped_due_to_conflicts.append(conflicting_mod)
-                else:
-                    # Существующий мод популярнее - оставляем его
-                    print(f"   ⏭️  Skipping {mod.get('name')} ({mod_downloads:,} downloads) - keeping {conflicting_mod.get('name')} ({conflicting_downloads:,} downloads)")
-                    skipped_due_to_conflicts.append(mod)
-            else:
-                # Не нашли конфликтующий мод - пропускаем
-                print(f"   ⏭️  Skipping {mod.get('name')} - {reason}")
-                skipped_due_to_conflicts.append(mod)
+        if is_compatible:
+            resolved_index.add(mod)
+            accepted_ids.add(id(mod))
+            continue
+        
+        # Конфликтующий мод популярнее - оставляем его
+        if conflicting_mod is not None:
+            logger.info("   ⏭️  Skipping %s (%s downloads) - keeping %s (%s downloads)", mod.get('name'), format(mod.get('downloads') or 0, ','), conflicting_mod.get('name'), format(conflicting_mod.get('downloads') or 0, ','))
         else:
-            # Нет конфликтов - добавляем
-            resolved_mods.append(mod)
+            logger.debug("   ⏭️  Skipping %s - %s", mod.get('name'), reason)
+        skipped_due_to_conflicts.append(mod)
+    
+    # Сохраняем исходный порядок модов
+    resolved_mods = [m for m in filtered_selected_mods if id(m) in accepted_ids]
     
     if skipped_due_to_conflicts:
-        print(f"   💥 Resolved {len(skipped_due_to_conflicts)} conflict(s)")
+        logger.info("   💥 Resolved %s conflict(s)", len(skipped_due_to_conflicts))
     
     filtered_selected_mods = resolved_mods
     
-    # Сначала собираем все нужные source_id зависимостей
-    print("\n📦 Collecting required dependencies...")
-    all_dep_ids_to_fetch = set()
-    skipped_deps = []  # Для логирования пропущенных зависимостей
-    
-    for mod in filtered_selected_mods:
-        mod_name = mod.get('name', 'unknown')
-        dependencies = mod.get('dependencies', {})
-        if isinstance(dependencies, str):
-            try:
-                dependencies = json.loads(dependencies)
-            except:
-                dependencies = {}
-        
-        if not isinstance(dependencies, dict):
-            continue
+    # Резолвим зависимости волнами (BFS): на каждом уровне одним батчем фетчим
+    # зависимости текущего фронтира, затем обрабатываем их и переходим к их зависимостям.
+    # Каждый мод попадает во фронтир не больше одного раза (processed_mods/dependencies_by_id),
+    # поэтому обход конечен и на циклах - глубина ограничена реальным графом
+    dependency_mods_map: Dict[str, Dict] = {}
+    existing_index = _IncompatIndex(selected_mods)  # Выбранные + добавленные зависимости
+    requested_dep_ids: Set[str] = set()  # Уже запрошенные из БД (в т.ч. не найденные)
+    frontier = filtered_selected_mods
+    depth = 0
+    
+    while frontier:
+        # Собираем все нужные source_id зависимостей этой волны
+        if depth == 0:
+            logger.info("📦 Collecting required dependencies...")
+        dep_ids_to_fetch = set()
+        skipped_count = 0
+        # Строки пропущенных зависимостей нужны только для debug-лога - первые 10
+        skipped_deps = [] if (depth == 0 and logger.isEnabledFor(logging.DEBUG)) else None
         
-        for dep_source_id, dep_info in dependencies.items():
-            dep_name = dep_info.get('name', dep_source_id[:8] + '...')
-            dep_type = dep_info.get('type', 'optional')
-            if dep_type != 'required':
-                skipped_deps.append(f"{mod_name} → {dep_name} (optional)")
-                continue
-            
-            # Проверяем версию MC
-            dep_versions = dep_info.get('versions', [])
-            if dep_versions and mc_version not in dep_versions:
-                version_match = any(
-                    mc_version.startswith(v) or v.startswith(mc_version) 
-                    for v in dep_versions
-                )
-                if not version_match:
-                    skipped_deps.append(f"{mod_name} → {dep_name} (version mismatch: {dep_versions})")
+        for mod in frontier:
+            for dep_source_id, dep_info in mod['dependencies'].items():
+                skip_reason = None
+                if dep_info.get('type', 'optional') != 'required':
+                    skip_reason = 'optional'
+                elif not mc_version_ok(dep_info.get('versions', [])):
+                    # Проверяем версию MC
+                    skip_reason = f"version mismatch: {dep_info.get('versions', [])}"
+                elif dep_source_id in selected_source_ids:
+                    # Пропускаем если уже выбран
+                    skip_reason = 'already selected'
+                
+                if skip_reason:
+                    skipped_count += 1
+                    if skipped_deps is not None and len(skipped_deps) < 10:
+                        dep_name = dep_info.get('name', dep_source_id[:8] + '...')
+                        skipped_deps.append(f"{mod.get('name', 'unknown')} → {dep_name} ({skip_reason})")
                     continue
-            
-            # Пропускаем если уже выбран
-            if dep_source_id in selected_source_ids:
-                skipped_deps.append(f"{mod_name} → {dep_name} (already selected)")
-                continue
-            
-            all_dep_ids_to_fetch.add(dep_source_id)
-    
-    print(f"   🔍 Found {len(all_dep_ids_to_fetch)} unique dependencies to fetch")
-    if skipped_deps:
-        print(f"   ℹ️  Skipped {len(skipped_deps)} dependencies (optional/already selected/version mismatch)")
-        # Показываем первые 10 пропущенных для отладки
-        for skipped in skipped_deps[:10]:
-            print(f"      - {skipped}")
-        if len(skipped_deps) > 10:
-            print(f"      ... and {len(skipped_deps) - 10} more")
-    
-    # Фетчим все зависимости одним запросом
-    if all_dep_ids_to_fetch:
-        print(f"   🚀 Fetching all dependencies in one batch...")
-        dependency_mods_map = fetch_mods_batch(list(all_dep_ids_to_fetch))
-        fetched_count = len(dependency_mods_map)
-        total_count = len(all_dep_ids_to_fetch)
-        print(f"   ✅ Fetched {fetched_count}/{total_count} mods from DB")
-        if fetched_count < total_count:
-            missing_ids = all_dep_ids_to_fetch - set(dependency_mods_map.keys())
-            print(f"   ⚠️  Missing {len(missing_ids)} dependencies in DB:")
-            for missing_id in list(missing_ids)[:5]:
-                print(f"      - {missing_id[:8]}...")
-            if len(missing_ids) > 5:
-                print(f"      ... and {len(missing_ids) - 5} more")
-    else:
-        dependency_mods_map = {}
-    
-    # Теперь обрабатываем зависимости с уже загруженными данными
-    print("\n🔧 Processing dependencies...")
-    for mod in filtered_selected_mods:
-        process_mod_dependencies(mod, dependency_mods_map)
+                
+                if dep_source_id not in requested_dep_ids:
+                    dep_ids_to_fetch.add(dep_source_id)
+        
+        if depth == 0:
+            logger.info("   🔍 Found %s unique dependencies to fetch", len(dep_ids_to_fetch))
+            if skipped_count:
+                logger.info("   ℹ️  Skipped %s dependencies (optional/already selected/version mismatch)", skipped_count)
+                # Показываем первые 10 пропущенных для отладки
+                for skipped in skipped_deps or ():
+                    logger.debug("      - %s", skipped)
+                if skipped_deps is not None and skipped_count > 10:
+                    logger.debug("      ... and %s more", skipped_count - 10)
+        elif dep_ids_to_fetch:
+            logger.info("📦 Transitive dependencies (level %s): %s to fetch", depth + 1, len(dep_ids_to_fetch))
+        
+        # Фетчим все зависимости волны одним батчем
+        if dep_ids_to_fetch:
+            logger.info("   🚀 Fetching dependencies in batches...")
+            fetched_map = fetch_mods_batch(list(dep_ids_to_fetch), supabase_url, supabase_key)
+            requested_dep_ids |= dep_ids_to_fetch
+            dependency_mods_map.update(fetched_map)
+            fetched_count = len(fetched_map)
+            total_count = len(dep_ids_to_fetch)
+            logger.info("   ✅ Fetched %s/%s mods from DB", fetched_count, total_count)
+            if fetched_count < total_count:
+                missing_ids = dep_ids_to_fetch - set(fetched_map.keys())
+                logger.warning("   ⚠️  Missing %s dependencies in DB:", len(missing_ids))
+                for missing_id in list(missing_ids)[:5]:
+                    logger.debug("      - %s...", missing_id[:8])
+                if len(missing_ids) > 5:
+                    logger.debug("      ... and %s more", len(missing_ids) - 5)
+        
+        # Обрабатываем зависимости волны с уже загруженными данными
+        if depth == 0:
+            logger.info("🔧 Processing dependencies...")
+        next_frontier = []
+        for mod in frontier:
+            next_frontier.extend(process_mod_dependencies(mod, dependency_mods_map, depth))
+        
+        frontier = next_frontier
+        depth += 1
     
     # Объединяем результаты
     final_mods = filtered_selected_mods + dependencies_to_add
     
     # Логируем добавленные зависимости для отладки
     if dependencies_to_add:
-        print(f"\n📋 Added dependencies ({len(dependencies_to_add)} mods):")
-        for dep in dependencies_to_add:
+        logger.info("📋 Added dependencies (%s mods):", len(dependencies_to_add))
+        for dep in (dependencies_to_add if logger.isEnabledFor(logging.DEBUG) else ()):
             dep_name = dep.get('name', 'Unknown')
             dep_source_id = dep.get('source_id', 'unknown')
             dep_of = dep.get('_dependency_of', 'unknown')
-            print(f"   • {dep_name} (source_id: {dep_source_id[:8]}..., required by: {dep_of})")
+            logger.debug("   • %s (source_id: %s..., required by: %s)", dep_name, dep_source_id[:8], dep_of)
     
     # ПРОВЕРКА КОНФЛИКТОВ С ЗАВИСИМОСТЯМИ
     # Если мод A требует зависимость B, а мод C конфликтует с B, отсекаем C
-    print("\n🔍 Checking conflicts with dependencies...")
+    logger.info("🔍 Checking conflicts with dependencies...")
     mods_to_remove = []
+    mods_to_remove_ids: Set[int] = set()  # id() удаляемых модов для O(1) проверки
+    # Граф несовместимостей выбранных модов строим один раз: для каждой зависимости
+    # сразу получаем связанные с ней выбранные моды вместо прохода по всем
+    selected_index = _IncompatIndex(filtered_selected_mods)
     
     for mod in filtered_selected_mods:
-        # Получаем зависимости этого мода
-        mod_deps = mod.get('dependencies', {})
-        if isinstance(mod_deps, str):
-            try:
-                mod_deps = json.loads(mod_deps)
-            except:
-                mod_deps = {}
-        
-        if not isinstance(mod_deps, dict):
-            continue
-        
-        # Проверяем каждую зависимость
-        for dep_source_id, dep_info in mod_deps.items():
+        # Проверяем каждую зависимость этого мода
+        for dep_source_id, dep_info in mod['dependencies'].items():
             if dep_info.get('type') != 'required':
                 continue
             
             # Ищем эту зависимость среди добавленных dependencies
-            dep_mod = next((d for d in dependencies_to_add if d.get('source_id') == dep_source_id), None)
+            dep_mod = dependencies_by_id.get(dep_source_id)
             if not dep_mod:
                 continue
             
             # Проверяем, не конфликтует ли какой-то выбранный мод с этой зависимостью
-            for other_mod in filtered_selected_mods:
-                if other_mod == mod:
+            # (candidates - выбранные моды, конфликтующие с dep_mod в любую сторону)
+            for other_mod in selected_index.candidates(dep_mod):
+                if other_mod is mod:
                     continue
                 
-                # Проверяем конфликт в обе стороны
-                other_incompats = other_mod.get('incompatibilities', {})
-                if isinstance(other_incompats, str):
-                    try:
-                        other_incompats = json.loads(other_incompats)
-                    except:
-                        other_incompats = {}
-                
-                dep_incompats = dep_mod.get('incompatibilities', {})
-                if isinstance(dep_incompats, str):
-                    try:
-                        dep_incompats = json.loads(dep_incompats)
-                    except:
-                        dep_incompats = {}
-                
-                if not isinstance(other_incompats, dict):
-                    other_incompats = {}
-                if not isinstance(dep_incompats, dict):
-                    dep_incompats = {}
-                
-                # Если other_mod конфликтует с dep_mod (зависимостью mod)
-                if (dep_source_id in other_incompats) or (other_mod.get('source_id') in dep_incompats):
-                    # Отсекаем other_mod, так как он конфликтует с зависимостью mod
-                    if other_mod not in mods_to_remove:
-                        mods_to_remove.append(other_mod)
-                        reason = other_incompats.get(dep_source_id, {}).get('reason', '') or dep_incompats.get(other_mod.get('source_id'), {}).get('reason', '')
-                        print(f"   ⚠️  Removing {other_mod.get('name')} - conflicts with {dep_mod.get('name')} (required by {mod.get('name')})")
-                        if reason:
-                            print(f"      Reason: {reason}")
+                # other_mod конфликтует с dep_mod (зависимостью mod) - отсекаем other_mod
+                if id(other_mod) not in mods_to_remove_ids:
+                    mods_to_remove.append(other_mod)
+                    mods_to_remove_ids.add(id(other_mod))
+                    other_incompats = other_mod['incompatibilities']
+                    dep_incompats = dep_mod['incompatibilities']
+                    reason = other_incompats.get(dep_source_id, {}).get('reason', '') or dep_incompats.get(other_mod.get('source_id'), {}).get('reason', '')
+                    logger.warning("   ⚠️  Removing %s - conflicts with %s (required by %s)", other_mod.get('name'), dep_mod.get('name'), mod.get('name'))
+                    if reason:
+                        logger.warning("      Reason: %s", reason)
     
     # Удаляем конфликтующие моды
     if mods_to_remove:
         # Логируем что удаляем
         for mod_to_remove in mods_to_remove:
-            print(f"   ⚠️  Will remove: {mod_to_remove.get('name')} (source_id: {mod_to_remove.get('source_id', 'unknown')[:8]}...)")
-        
-        final_mods = [m for m in final_mods if m not in mods_to_remove]
-        filtered_selected_mods = [m for m in filtered_selected_mods if m not in mods_to_remove]
-        print(f"   ✅ Removed {len(mods_to_remove)} mod(s) conflicting with dependencies")
+            logger.warning("   ⚠️  Will remove: %s (source_id: %s...)", mod_to_remove.get('name'), mod_to_remove.get('source_id', 'unknown')[:8])
         
+        final_mods = [m for m in final_mods if id(m) not in mods_to_remove_ids]
+        filtered_selected_mods = [m for m in filtered_selected_mods if id(m) not in mods_to_remove_ids]
+        logger.info("   ✅ Removed %s mod(s) conflicting with dependencies", len(mods_to_remove))
+    
+    # Один раз считаем, какие добавленные зависимости не попали в final_mods -
+    # по этому списку строятся все проверки ниже
+    final_source_ids = {m.get('source_id') for m in final_mods}
+    missing_dep_mods = [
+        dep for dep in dependencies_to_add
+        if dep.get('source_id') and dep['source_id'] not in final_source_ids
+    ]
+    final_deps_count = sum(1 for m in final_mods if m.get('_added_as_dependency'))
+    
+    if mods_to_remove:
         # Проверяем, что зависимости не были случайно удалены
         deps_before = len(dependencies_to_add)
-        deps_after = sum(1 for m in final_mods if m.get('_added_as_dependency'))
+        deps_after = final_deps_count
         if deps_before != deps_after:
-            print(f"   ⚠️  WARNING: Dependency count changed! Before: {deps_before}, After: {deps_after}")
-            # Находим какие зависимости пропали
-            missing_deps = []
-            for dep in dependencies_to_add:
-                dep_source_id = dep.get('source_id')
-                if dep_source_id:
-                    found = any(m.get('source_id') == dep_source_id for m in final_mods)
-                    if not found:
-                        missing_deps.append(f"{dep.get('name')} (source_id: {dep_source_id[:8]}...)")
-            if missing_deps:
-                print(f"      Missing dependencies: {', '.join(missing_deps[:3])}")
-                if len(missing_deps) > 3:
-                    print(f"      ... and {len(missing_deps) - 3} more")
-    
-    print()
-    print(f"✅ [Dependency Resolver] Complete:")
-    print(f"   - AI selected: {len(selected_mods)} mods")
-    print(f"   - After loader filter: {len(filtered_selected_mods)} mods")
-    print(f"   - Dependencies added: {len(dependencies_to_add)} mods")
-    print(f"   - Total: {len(final_mods)} mods ({len(filtered_selected_mods)} gameplay + {len(dependencies_to_add)} libraries)")
-    print(f"   ℹ️  Dependencies are NOT counted in mod limit (they're libraries)")
+            logger.warning("   ⚠️  WARNING: Dependency count changed! Before: %s, After: %s", deps_before, deps_after)
+            # Какие зависимости пропали
+            if missing_dep_mods:
+                logger.warning("      Missing dependencies: %s", ', '.join(
+                    f"{dep.get('name')} (source_id: {dep['source_id'][:8]}...)" for dep in missing_dep_mods[:3]
+                ))
+                if len(missing_dep_mods) > 3:
+                    logger.warning("      ... and %s more", len(missing_dep_mods) - 3)
+    
+    logger.info("✅ [Dependency Resolver] Complete:")
+    logger.info("   - AI selected: %s mods", len(selected_mods))
+    logger.info("   - After loader filter: %s mods", len(filtered_selected_mods))
+    logger.info("   - Dependencies added: %s mods", len(dependencies_to_add))
+    logger.info("   - Total: %s mods (%s gameplay + %s libraries)", len(final_mods), len(filtered_selected_mods), len(dependencies_to_add))
+    logger.info("   ℹ️  Dependencies are NOT counted in mod limit (they're libraries)")
     
     # Проверяем, что все зависимости действительно в финальном списке
-    if dependencies_to_add:
-        missing_deps = []
-        for dep in dependencies_to_add:
-            dep_source_id = dep.get('source_id')
-            if dep_source_id:
-                found = any(m.get('source_id') == dep_source_id for m in final_mods)
-                if not found:
-                    missing_deps.append(dep.get('name', 'Unknown'))
-        
-        if missing_deps:
-            print(f"   ⚠️  Warning: {len(missing_deps)} dependency(ies) were added but NOT found in final mods:")
-            for dep_name in missing_deps[:5]:  # Показываем первые 5
-                print(f"      - {dep_name}")
-            if len(missing_deps) > 5:
-                print(f"      ... and {len(missing_deps) - 5} more")
-    
-    print()
+    if missing_dep_mods:
+        logger.warning("   ⚠️  Warning: %s dependency(ies) were added but NOT found in final mods:", len(missing_dep_mods))
+        for dep in missing_dep_mods[:5]:  # Показываем первые 5
+            logger.warning("      - %s", dep.get('name', 'Unknown'))
+        if len(missing_dep_mods) > 5:
+            logger.warning("      ... and %s more", len(missing_dep_mods) - 5)
+    
+    # Циклы required-зависимостей (данные в БД) - только сообщаем, обход на них конечен
+    dependency_cycles = _find_dependency_cycles(final_mods)
+    if dependency_cycles:
+        names = {m.get('source_id'): m.get('name', m.get('source_id')) for m in final_mods}
+        logger.warning("   ⚠️  Found %s dependency cycle(s):", len(dependency_cycles))
+        for cycle in dependency_cycles[:5]:
+            logger.warning("      - %s", ' → '.join(str(names.get(sid, sid)) for sid in cycle + cycle[:1]))
     
     # Финальная проверка перед возвратом
-    final_deps_count = sum(1 for m in final_mods if m.get('_added_as_dependency'))
     final_selected_count = len(final_mods) - final_deps_count
-    print(f"🔍 [Final Check] Returning {len(final_mods)} mods:")
-    print(f"   - Selected mods: {final_selected_count}")
-    print(f"   - Dependencies: {final_deps_count}")
+    logger.info("🔍 [Final Check] Returning %s mods:", len(final_mods))
+    logger.info("   - Selected mods: %s", final_selected_count)
+    logger.info("   - Dependencies: %s", final_deps_count)
     
     # Проверяем наличие всех зависимостей по source_id
-    if dependencies_to_add:
-        missing_in_final = []
-        for dep in dependencies_to_add:
-            dep_source_id = dep.get('source_id')
-            if dep_source_id:
-                found = any(m.get('source_id') == dep_source_id for m in final_mods)
-                if not found:
-                    missing_in_final.append(f"{dep.get('name')} ({dep_source_id[:8]}...)")
-        
-        if missing_in_final:
-            print(f"   ⚠️  CRITICAL: {len(missing_in_final)} dependency(ies) missing in final_mods:")
-            for missing in missing_in_final[:5]:
-                print(f"      - {missing}")
-            if len(missing_in_final) > 5:
-                print(f"      ... and {len(missing_in_final) - 5} more")
+    if missing_dep_mods:
+        logger.warning("   ⚠️  CRITICAL: %s dependency(ies) missing in final_mods:", len(missing_dep_mods))
+        for dep in missing_dep_mods[:5]:
+            logger.warning("      - %s (%s...)", dep.get('name'), dep['source_id'][:8])
+        if len(missing_dep_mods) > 5:
+            logger.warning("      ... and %s more", len(missing_dep_mods) - 5)
     
     return final_mods
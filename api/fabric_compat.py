@@ -3,10 +3,15 @@ Fabric Compatibility Manager
 Управляет автоматическим добавлением compatibility mods на основе конфига
 """
 
-import json
+import logging
 import os
 from typing import List, Dict, Optional
 
+from supabase_http import fetch_mods_by_source_ids, json_loads
+
+
+logger = logging.getLogger(__name__)
+
 
 class FabricCompatManager:
     """Управляет Fabric Compatibility mode на основе конфига"""
@@ -16,8 +21,24 @@ class FabricCompatManager:
             # По умолчанию ищем конфиг в корне проекта
             config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fabric_compat_config.json')
         
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.config_path = config_path
+        # mtime прочитанного конфига - get_fabric_compat_manager пересоздаёт менеджер при изменении файла
+        self.config_mtime = os.path.getmtime(config_path)
+        with open(config_path, 'rb') as f:
+            self.config = json_loads(f.read())
+        
+        # Индексы по конфигу: O(1) поиск правила и connector'а вместо линейных проходов.
+        # setdefault - при дублях выигрывает первое правило, как и при линейном поиске
+        self._rules_by_key: Dict[tuple, Dict] = {}
+        for rule in self.config['compatibility_rules']:
+            if not rule['enabled']:
+                continue
+            conditions = rule['conditions']
+            key = (conditions['mod_loader'].lower(), conditions['mc_version'])
+            self._rules_by_key.setdefault(key, rule)
+        
+        self._connector_ids = frozenset(self.config['auto_enable_triggers']['connector_mods'])
+        self._sorted_required_mods_cache: Dict[tuple, List[Dict]] = {}
     
     def get_compatibility_rule(self, mod_loader: str, mc_version: str) -> Optional[Dict]:
         """
@@ -30,16 +51,7 @@ class FabricCompatManager:
         Returns:
             Правило совместимости или None
         """
-        for rule in self.config['compatibility_rules']:
-            if not rule['enabled']:
-                continue
-            
-            conditions = rule['conditions']
-            if (conditions['mod_loader'].lower() == mod_loader.lower() and 
-                conditions['mc_version'] == mc_version):
-                return rule
-        
-        return None
+        return self._rules_by_key.get((mod_loader.lower(), mc_version))
     
     def get_required_mods(self, mod_loader: str, mc_version: str) -> List[Dict]:
         """
@@ -48,22 +60,27 @@ class FabricCompatManager:
         Returns:
             Список модов с metadata (source_id, name, reason, priority)
         """
-        rule = self.get_compatibility_rule(mod_loader, mc_version)
-        if not rule:
-            return []
-        
-        # Сортируем по приоритету
-        required_mods = sorted(
-            rule['required_mods'], 
-            key=lambda m: m.get('priority', 999)
-        )
+        key = (mod_loader.lower(), mc_version)
+        required_mods = self._sorted_required_mods_cache.get(key)
         
-        return required_mods
+        if required_mods is None:
+            rule = self._rules_by_key.get(key)
+            if not rule:
+                return []
+            
+            # Сортируем по приоритету (один раз на конфигурацию)
+            required_mods = sorted(
+                rule['required_mods'], 
+                key=lambda m: m.get('priority', 999)
+            )
+            self._sorted_required_mods_cache[key] = required_mods
+        
+        # Копия списка - вызывающий код не испортит кэш
+        return list(required_mods)
     
     def is_connector_mod(self, source_id: str) -> bool:
         """Проверяет, является ли мод connector'ом (триггером авто-включения)"""
-        connector_ids = self.config['auto_enable_triggers']['connector_mods']
-        return source_id in connector_ids
+        return source_id in self._connector_ids
     
     def get_category_config(self) -> Dict:
         """Возвращает конфигурацию категории для Fabric Compatibility"""
@@ -88,51 +105,43 @@ class FabricCompatManager:
         Returns:
             Список модов с полными данными из БД
         """
-        import requests
-        
         required_mods_meta = self.get_required_mods(mod_loader, mc_version)
         
         if not required_mods_meta:
-            print(f"   ℹ️  No compatibility mods required for {mod_loader} {mc_version}")
+            logger.info("   ℹ️  No compatibility mods required for %s %s", mod_loader, mc_version)
             return []
         
-        print(f"🔧 Fabric Compatibility Mode: {mod_loader} {mc_version}")
-        print(f"   Fetching {len(required_mods_meta)} compatibility mods...")
+        logger.info("🔧 Fabric Compatibility Mode: %s %s", mod_loader, mc_version)
+        logger.info("   Fetching %s compatibility mods...", len(required_mods_meta))
+        
+        # Один запрос с in.(...) на чанк вместо запроса на каждый мод
+        rows_by_id, failed = fetch_mods_by_source_ids(
+            [m['source_id'] for m in required_mods_meta], supabase_url, supabase_key, timeout=10
+        )
+        failed_ids = set(failed)
+        if failed_ids:
+            logger.error("   ❌ Failed to fetch %s compatibility mods", len(failed_ids))
         
         fetched_mods = []
         
         for mod_meta in required_mods_meta:
             source_id = mod_meta['source_id']
+            row = rows_by_id.get(source_id)
             
-            try:
-                response = requests.get(
-                    f'{supabase_url}/rest/v1/mods',
-                    params={'source_id': f'eq.{source_id}', 'select': '*'},
-                    headers={
-                        'apikey': supabase_key,
-                        'Authorization': f'Bearer {supabase_key}'
-                    },
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data:
-                        mod = data[0]
-                        # Добавляем metadata
-                        mod['_compat_reason'] = mod_meta['reason']
-                        mod['_compat_priority'] = mod_meta['priority']
-                        fetched_mods.append(mod)
-                        print(f"   ✅ {mod['name']}: {mod_meta['reason']}")
-                    else:
-                        print(f"   ⚠️  Mod {mod_meta['name']} ({source_id}) not found in DB")
-                else:
-                    print(f"   ❌ Failed to fetch {mod_meta['name']}: {response.status_code}")
+            if row is None:
+                if source_id not in failed_ids:
+                    logger.warning("   ⚠️  Mod %s (%s) not found in DB", mod_meta['name'], source_id)
+                continue
             
-            except Exception as e:
-                print(f"   ❌ Error fetching {mod_meta['name']}: {e}")
+            # Копия: одна строка БД может понадобиться нескольким записям конфига
+            mod = dict(row)
+            # Добавляем metadata
+            mod['_compat_reason'] = mod_meta['reason']
+            mod['_compat_priority'] = mod_meta['priority']
+            fetched_mods.append(mod)
+            logger.debug("   ✅ %s: %s", mod['name'], mod_meta['reason'])
         
-        print(f"   ✅ Successfully fetched {len(fetched_mods)}/{len(required_mods_meta)} compatibility mods")
+        logger.info("   ✅ Successfully fetched %s/%s compatibility mods", len(fetched_mods), len(required_mods_meta))
         
         return fetched_mods
     
@@ -146,8 +155,15 @@ _manager_instance = None
 
 
 def get_fabric_compat_manager() -> FabricCompatManager:
-    """Возвращает глобальный экземпляр FabricCompatManager"""
+    """Возвращает глобальный экземпляр FabricCompatManager (пересоздаётся, если конфиг изменился)"""
     global _manager_instance
     if _manager_instance is None:
         _manager_instance = FabricCompatManager()
+    else:
+        try:
+            if os.path.getmtime(_manager_instance.config_path) != _manager_instance.config_mtime:
+                _manager_instance = FabricCompatManager(_manager_instance.config_path)
+        except (OSError, ValueError, KeyError) as e:
+            # Файл недоступен или записан не до конца - работаем со старым конфигом, проверим в следующий раз
+            logger.warning("⚠️  Failed to reload fabric compat config: %s", e)
     return _manager_instance
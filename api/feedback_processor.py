@@ -3,10 +3,34 @@ Feedback Processor
 Обрабатывает пользовательские жалобы на моды и автоматически обновляет БД
 """
 
-import json
-import requests
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional
 
+from dependency_resolver import invalidate_mod_cache
+from supabase_http import SESSION, json_dumps, json_loads
+
+
+logger = logging.getLogger(__name__)
+
+# Независимые записи в БД (разные моды) идут параллельно - RTT к Supabase перекрываются.
+# pool_maxsize общей сессии >= max_workers, соединения переиспользуются между потоками
+_DB_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='feedback-db')
+
+# Когда PostgREST ответил, что функции merge_incompat нет (PGRST202); None - считаем доступной.
+# Через MERGE_RPC_REPROBE_INTERVAL пробуем снова - миграцию можно накатить без рестарта.
+# Без lock: гонка между потоками приводит максимум к лишней пробе RPC
+MERGE_RPC_REPROBE_INTERVAL = 600  # секунд
+_merge_rpc_missing_since: Optional[float] = None
+
+# Сколько модов доски попадает в промпт
+PROMPT_MODS_LIMIT = 50
+
+# Слова фидбека для ранжирования модов в промпте
+_WORD_RE = re.compile(r'\w+')
+
 
 def process_feedback(
     feedback_text: str,
@@ -28,11 +52,10 @@ def process_feedback(
     Returns:
         Dict с результатом обработки
     """
-    print("=" * 80)
-    print("🔍 [Feedback Processor] Analyzing user feedback...")
-    print("=" * 80)
-    print(f"Feedback: {feedback_text}")
-    print()
+    logger.info("=" * 80)
+    logger.info("🔍 [Feedback Processor] Analyzing user feedback...")
+    logger.info("=" * 80)
+    logger.info("Feedback: %s", feedback_text)
     
     # Извлекаем названия модов из board_state
     mods_list = []
@@ -45,6 +68,24 @@ def process_feedback(
             for mod in board_state['mods']
         ]
     
+    # Индекс имён строится один раз: exact - O(1) по dict, fuzzy - один проход.
+    # Результаты запоминаются - affected_mods повторяются для каждой пары
+    name_map, fuzzy_pairs = _build_name_index(mods_list)
+    found_mods = {}
+    
+    def find_mod(query: Optional[str]) -> Optional[Dict]:
+        if query not in found_mods:
+            found_mods[query] = _find_mod(query, name_map, fuzzy_pairs)
+        return found_mods[query]
+    
+    # Без модов с именами AI нечего сопоставлять - не тратим вызов Deepseek
+    if not fuzzy_pairs:
+        logger.warning("⚠️  [Feedback Processor] No named mods on board, skipping AI analysis")
+        return {
+            'success': False,
+            'reason': 'No mods on board to match feedback against'
+        }
+    
     # Формируем промпт для AI
     system_prompt = """You are an expert mod compatibility analyzer. Your task is to analyze user feedback about mod incompatibilities and extract structured data.
 
@@ -139,7 +180,8 @@ Output: {
   "confidence": 0.85
 }"""
     
-    mods_context = "\n".join([f"- {m['name']} (id: {m['source_id']})" for m in mods_list[:50]])
+    prompt_mods = _select_prompt_mods(fuzzy_pairs, feedback_text, PROMPT_MODS_LIMIT)
+    mods_context = "\n".join([f"- {m['name']} (id: {m['source_id']})" for m in prompt_mods])
     
     user_message = f"""USER FEEDBACK: "{feedback_text}"
 
@@ -155,13 +197,13 @@ Return JSON format only."""
     
     try:
         # Отправляем в Deepseek
-        response = requests.post(
+        response = SESSION.post(
             'https://api.deepseek.com/v1/chat/completions',
             headers={
                 'Authorization': f'Bearer {deepseek_key}',
                 'Content-Type': 'application/json'
             },
-            json={
+            data=json_dumps({
                 'model': 'deepseek-chat',
                 'messages': [
                     {'role': 'system', 'content': system_prompt},
@@ -169,7 +211,7 @@ Return JSON format only."""
                 ],
                 'temperature': 0.1,  # Низкая температура для точности
                 'max_tokens': 1000
-            },
+            }),
             timeout=30
         )
         
@@ -179,27 +221,26 @@ Return JSON format only."""
                 'error': f'Deepseek API error: {response.status_code}'
             }
         
-        result = response.json()
+        result = json_loads(response.content)
         content = result['choices'][0]['message']['content'].strip()
         
         # Парсим JSON
         content = content.replace('```json', '').replace('```', '').strip()
         
         # Ищем JSON в ответе
-        import re
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        if not json_match:
+        json_text = _extract_json_object(content)
+        if not json_text:
             return {
                 'success': False,
                 'error': 'Could not parse AI response'
             }
         
-        analysis = json.loads(json_match.group())
+        analysis = json_loads(json_text)
         
-        print(f"📥 [AI Analysis] Valid: {analysis.get('valid')}, Confidence: {analysis.get('confidence')}")
+        logger.info("📥 [AI Analysis] Valid: %s, Confidence: %s", analysis.get('valid'), analysis.get('confidence'))
         
         if not analysis.get('valid') or analysis.get('confidence', 0) < 0.7:
-            print("⚠️  [Feedback Processor] Low confidence or invalid feedback")
+            logger.warning("⚠️  [Feedback Processor] Low confidence or invalid feedback")
             return {
                 'success': False,
                 'reason': 'Feedback is not about incompatibilities or confidence too low',
@@ -213,11 +254,11 @@ Return JSON format only."""
         outdated_mods = analysis.get('outdated_mods', [])
         loaders = analysis.get('loaders')  # None или ['neoforge', 'fabric', ...]
         
-        print(f"📊 [AI Analysis] Feedback type: {feedback_type}")
-        print(f"📊 [AI Analysis] Incompatible mods: {incompatible_mods}")
-        print(f"📊 [AI Analysis] Affected mods: {affected_mods}")
-        print(f"📊 [AI Analysis] Outdated mods: {outdated_mods}")
-        print(f"📊 [AI Analysis] Loaders: {loaders if loaders else 'all (global)'}")
+        logger.debug("📊 [AI Analysis] Feedback type: %s", feedback_type)
+        logger.debug("📊 [AI Analysis] Incompatible mods: %s", incompatible_mods)
+        logger.debug("📊 [AI Analysis] Affected mods: %s", affected_mods)
+        logger.debug("📊 [AI Analysis] Outdated mods: %s", outdated_mods)
+        logger.debug("📊 [AI Analysis] Loaders: %s", loaders if loaders else 'all (global)')
         
         if not incompatible_mods and not outdated_mods:
             return {
@@ -226,60 +267,67 @@ Return JSON format only."""
             }
         
         if feedback_type == 'outdated_mod':
-            print(f"✅ [Feedback Processor] Found {len(outdated_mods)} outdated mod(s)")
+            logger.info("✅ [Feedback Processor] Found %s outdated mod(s)", len(outdated_mods))
             
             # Проверяем GOD MODE (фидбек начинается с "GOD***")
             is_god_mode = feedback_text.strip().upper().startswith('GOD***')
             if is_god_mode:
-                print(f"👑 [GOD MODE DETECTED] Admin override - instant blacklist")
+                logger.info("👑 [GOD MODE DETECTED] Admin override - instant blacklist")
             
             # Обновляем БД для устаревших модов
             updates_made = []
+            planned = []  # (мод доски, причина) в порядке ответа AI
             
             for outdated_mod in outdated_mods:
                 mod_name = outdated_mod['mod_name']
                 reason = outdated_mod['reason']
                 
                 # Находим source_id мода по имени
-                matching_mod = None
-                
-                # 1. Сначала ищем точное совпадение
-                for m in mods_list:
-                    if m['name'] and mod_name and m['name'].lower() == mod_name.lower():
-                        matching_mod = m
-                        break
-                
-                # 2. Если не нашли, ищем fuzzy
-                if not matching_mod:
-                    for m in mods_list:
-                        if m['name'] and mod_name and (m['name'].lower() in mod_name.lower() or mod_name.lower() in m['name'].lower()):
-                            matching_mod = m
-                            break
+                matching_mod = find_mod(mod_name)
                 
                 if not matching_mod:
-                    print(f"   ⚠️  Mod '{mod_name}' not found on board, skipping")
+                    logger.warning("   ⚠️  Mod '%s' not found on board, skipping", mod_name)
                     continue
                 
                 if not matching_mod.get('source_id'):
-                    print(f"   ⚠️  Mod '{mod_name}' has no source_id, skipping")
+                    logger.warning("   ⚠️  Mod '%s' has no source_id, skipping", mod_name)
                     continue
                 
+                planned.append((matching_mod, reason))
+            
+            # Разные моды помечаются параллельно; один и тот же мод - последовательно,
+            # иначе read-modify-write счётчика reported_count потеряет инкременты
+            indices_by_id = {}
+            for i, (matching_mod, _) in enumerate(planned):
+                indices_by_id.setdefault(matching_mod['source_id'], []).append(i)
+            
+            def mark_group(indices):
                 # Добавляем отметку "outdated" в incompatibilities
-                success = mark_mod_as_outdated(
-                    mod_source_id=matching_mod['source_id'],
-                    reason=reason,
-                    supabase_url=supabase_url,
-                    supabase_key=supabase_key,
-                    is_god_mode=is_god_mode
-                )
-                
+                return [
+                    mark_mod_as_outdated(
+                        mod_source_id=planned[i][0]['source_id'],
+                        reason=planned[i][1],
+                        supabase_url=supabase_url,
+                        supabase_key=supabase_key,
+                        is_god_mode=is_god_mode
+                    )
+                    for i in indices
+                ]
+            
+            futures = [(indices, _DB_EXECUTOR.submit(mark_group, indices)) for indices in indices_by_id.values()]
+            results = [False] * len(planned)
+            for indices, future in futures:
+                for i, success in zip(indices, future.result()):
+                    results[i] = success
+            
+            for (matching_mod, reason), success in zip(planned, results):
                 if success:
                     updates_made.append({
                         'mod': matching_mod['name'],
                         'action': 'marked_as_outdated',
                         'reason': reason
                     })
-                    print(f"   ✅ Marked {matching_mod['name']} as outdated")
+                    logger.info("   ✅ Marked %s as outdated", matching_mod['name'])
             
             return {
                 'success': True,
@@ -289,71 +337,53 @@ Return JSON format only."""
                 'updates_made': updates_made
             }
         
-        print(f"✅ [Feedback Processor] Found {len(incompatible_mods)} incompatible mod(s)")
+        logger.info("✅ [Feedback Processor] Found %s incompatible mod(s)", len(incompatible_mods))
         
         # Применяем изменения в БД
         updates_made = []
         
+        # Причины по имени мода (первая запись выигрывает) - для обратной связи
+        reasons_by_name = {}
+        for incompat in incompatible_mods:
+            if incompat['mod_name']:
+                reasons_by_name.setdefault(incompat['mod_name'].lower(), incompat['reason'])
+        
         for incompat_mod in incompatible_mods:
             mod_name = incompat_mod['mod_name']
             reason = incompat_mod['reason']
             
             # Находим source_id мода по имени (exact match сначала, потом fuzzy)
-            matching_mod = None
-            
-            # 1. Сначала ищем точное совпадение
-            for m in mods_list:
-                if m['name'] and mod_name and m['name'].lower() == mod_name.lower():
-                    matching_mod = m
-                    break
-            
-            # 2. Если не нашли, ищем fuzzy
-            if not matching_mod:
-                for m in mods_list:
-                    if m['name'] and mod_name and (m['name'].lower() in mod_name.lower() or mod_name.lower() in m['name'].lower()):
-                        matching_mod = m
-                        break
+            matching_mod = find_mod(mod_name)
             
             if not matching_mod:
-                print(f"   ⚠️  Mod '{mod_name}' not found on board, skipping")
+                logger.warning("   ⚠️  Mod '%s' not found on board, skipping", mod_name)
                 continue
             
             if not matching_mod.get('source_id'):
-                print(f"   ⚠️  Mod '{mod_name}' has no source_id, skipping")
+                logger.warning("   ⚠️  Mod '%s' has no source_id, skipping", mod_name)
                 continue
             
             # Находим affected моды (с которыми несовместим)
             for affected_name in affected_mods:
-                affected_mod = None
-                
-                # 1. Сначала ищем точное совпадение
-                for m in mods_list:
-                    if m['name'] and affected_name and m['name'].lower() == affected_name.lower():
-                        affected_mod = m
-                        break
-                
-                # 2. Если не нашли, ищем fuzzy
-                if not affected_mod:
-                    for m in mods_list:
-                        if m['name'] and affected_name and (m['name'].lower() in affected_name.lower() or affected_name.lower() in m['name'].lower()):
-                            affected_mod = m
-                            break
+                affected_mod = find_mod(affected_name)
                 
                 if not affected_mod or affected_mod['name'] == mod_name:
                     continue
                 
                 if not affected_mod.get('source_id'):
-                    print(f"   ⚠️  Affected mod '{affected_name}' has no source_id, skipping")
+                    logger.warning("   ⚠️  Affected mod '%s' has no source_id, skipping", affected_name)
                     continue
                 
                 # Проверяем что мод не несовместим сам с собой
                 if matching_mod['source_id'] == affected_mod['source_id']:
-                    print(f"   ⚠️  Skipping self-incompatibility: {matching_mod['name']} cannot be incompatible with itself")
+                    logger.warning("   ⚠️  Skipping self-incompatibility: %s cannot be incompatible with itself", matching_mod['name'])
                     continue
                 
-                # Обновляем БД (двунаправленно)
+                # Обновляем БД (двунаправленно) - две записи в разные строки идут параллельно.
+                # Пары между собой последовательны: один мод может встретиться в нескольких парах
                 # 1. Affected mod is incompatible with matching mod
-                success1 = add_incompatibility_to_db(
+                future1 = _DB_EXECUTOR.submit(
+                    add_incompatibility_to_db,
                     mod_source_id=affected_mod['source_id'],
                     incompatible_with_id=matching_mod['source_id'],
                     reason=reason,
@@ -364,11 +394,7 @@ Return JSON format only."""
                 
                 # 2. Matching mod is incompatible with affected mod (обратная связь)
                 # Ищем reason для affected_mod в incompatible_mods
-                reverse_reason = None
-                for incompat in incompatible_mods:
-                    if incompat['mod_name'].lower() == affected_mod['name'].lower():
-                        reverse_reason = incompat['reason']
-                        break
+                reverse_reason = reasons_by_name.get(affected_mod['name'].lower())
                 
                 if not reverse_reason:
                     reverse_reason = f"Incompatible with {affected_mod['name']}"
@@ -381,6 +407,7 @@ Return JSON format only."""
                     supabase_url=supabase_url,
                     supabase_key=supabase_key
                 )
+                success1 = future1.result()
                 
                 if success1 or success2:
                     updates_made.append({
@@ -388,7 +415,7 @@ Return JSON format only."""
                         'incompatible_with': mod_name,
                         'reason': reason
                     })
-                    print(f"   ✅ Added: {affected_mod['name']} ↔️ {mod_name}")
+                    logger.info("   ✅ Added: %s ↔️ %s", affected_mod['name'], mod_name)
         
         return {
             'success': True,
@@ -397,15 +424,176 @@ Return JSON format only."""
         }
         
     except Exception as e:
-        print(f"❌ [Feedback Processor] Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ [Feedback Processor] Error: %s", e)
         return {
             'success': False,
             'error': str(e)
         }
 
 
+def _build_name_index(mods_list: list) -> tuple:
+    """
+    Строит индекс модов доски по имени
+    
+    Returns:
+        (name_map, fuzzy_pairs): lower(name) -> первый мод с таким именем
+        и список (lower(name), mod) в порядке доски для fuzzy поиска
+    """
+    name_map = {}
+    fuzzy_pairs = []
+    for m in mods_list:
+        if m['name']:
+            name_lower = m['name'].lower()
+            name_map.setdefault(name_lower, m)
+            fuzzy_pairs.append((name_lower, m))
+    return name_map, fuzzy_pairs
+
+
+def _extract_json_object(text: str) -> Optional[str]:
+    """
+    Вырезает первый JSON-объект со сбалансированными скобками из ответа AI
+    
+    Один линейный проход с учётом строковых литералов (скобки внутри строк не считаются).
+    В отличие от жадного \\{.*\\} не склеивает несколько объектов и хвост после JSON.
+    
+    Returns:
+        Текст объекта или None, если '{' нет или объект не закрыт
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    
+    depth = 0
+    in_string = False
+    escaped = False
+    
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    
+    return None
+
+
+def _select_prompt_mods(fuzzy_pairs: list, feedback_text: str, limit: int) -> list:
+    """
+    Выбирает моды для промпта: если доска больше лимита - сначала те,
+    в имени которых встречаются слова из фидбека (при равенстве - порядок доски)
+    """
+    if len(fuzzy_pairs) <= limit:
+        return [m for _, m in fuzzy_pairs]
+    
+    words = {w for w in _WORD_RE.findall(feedback_text.lower()) if len(w) >= 3}
+    ranked = sorted(
+        fuzzy_pairs,
+        key=lambda pair: sum(w in pair[0] for w in words),
+        reverse=True
+    )
+    return [m for _, m in ranked[:limit]]
+
+
+def _find_mod(query: Optional[str], name_map: Dict, fuzzy_pairs: list) -> Optional[Dict]:
+    """Ищет мод по имени: сначала точное совпадение, потом вхождение подстроки в любую сторону"""
+    if not query:
+        return None
+    
+    query_lower = query.lower()
+    
+    # 1. Сначала ищем точное совпадение
+    mod = name_map.get(query_lower)
+    if mod is not None:
+        return mod
+    
+    # 2. Если не нашли, ищем fuzzy
+    return next(
+        (m for name_lower, m in fuzzy_pairs if name_lower in query_lower or query_lower in name_lower),
+        None
+    )
+
+
+def _merge_incompatibilities(
+    mod_source_id: str,
+    patch: Dict,
+    supabase_url: str,
+    supabase_key: str,
+    increment_key: Optional[str] = None,
+    latest_reason: Optional[str] = None
+) -> Optional[bool]:
+    """
+    Атомарно мержит patch в incompatibilities одним RPC (merge_incompat, см. database/migrations/001_merge_incompat.sql)
+    
+    Один UPDATE на стороне Postgres вместо GET + PATCH: вдвое меньше round-trip'ов
+    и нет потерянных обновлений при параллельных жалобах на один мод.
+    Если increment_key уже есть у мода - вместо замены увеличивается его reported_count.
+    
+    Returns:
+        True/False - мод обновлён / не найден или ошибка,
+        None - функция не задеплоена в БД (вызывающий код откатывается на GET + PATCH)
+    """
+    global _merge_rpc_missing_since
+    if _merge_rpc_missing_since is not None:
+        if time.monotonic() - _merge_rpc_missing_since < MERGE_RPC_REPROBE_INTERVAL:
+            return None
+        _merge_rpc_missing_since = None
+    
+    response = SESSION.post(
+        f'{supabase_url}/rest/v1/rpc/merge_incompat',
+        headers={
+            'apikey': supabase_key,
+            'Authorization': f'Bearer {supabase_key}',
+            'Content-Type': 'application/json'
+        },
+        data=json_dumps({
+            'p_source_id': mod_source_id,
+            'p_patch': patch,
+            'p_increment_key': increment_key,
+            'p_latest_reason': latest_reason
+        }),
+        timeout=10
+    )
+    
+    if response.status_code == 404:
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        error_code = body.get('code') if isinstance(body, dict) else None
+        
+        if error_code == 'PGRST202':
+            # Функции нет в schema cache - не пробуем её до следующей перепроверки
+            logger.warning("   ⚠️  [DB Update] RPC merge_incompat not deployed, using GET + PATCH for %ss", MERGE_RPC_REPROBE_INTERVAL)
+            _merge_rpc_missing_since = time.monotonic()
+        else:
+            # 404 не от PostgREST (прокси, роутинг) - разовый fallback, RPC не отключаем
+            logger.warning("   ⚠️  [DB Update] RPC merge_incompat returned 404 (%s), falling back to GET + PATCH", error_code)
+        return None
+    
+    if response.status_code != 200:
+        logger.error("   ❌ [DB Update] RPC merge_incompat failed: HTTP %s %s", response.status_code, response.text)
+        return False
+    
+    if not response.json():
+        logger.error("   ❌ [DB Query] Mod with source_id '%s' not found in database", mod_source_id)
+        return False
+    
+    # Резолвер зависимостей не должен пропускать свежие несовместимости из своего кэша
+    invalidate_mod_cache(mod_source_id)
+    return True
+
+
 def mark_mod_as_outdated(
     mod_source_id: str,
     reason: str,
@@ -421,12 +609,36 @@ def mark_mod_as_outdated(
         is_god_mode: Если True, устанавливает reported_count=100 (мгновенный бан)
     """
     try:
-        print(f"   📝 [DB Update] Marking mod '{mod_source_id}' as outdated")
+        logger.info("   📝 [DB Update] Marking mod '%s' as outdated", mod_source_id)
+        
+        if is_god_mode:
+            # GOD MODE: мгновенный бан - отметка перезаписывается целиком
+            merged = _merge_incompatibilities(
+                mod_source_id,
+                {'_OUTDATED_': {'reason': reason, 'type': 'outdated', 'auto_added': True, 'reported_count': 100, 'god_mode': True}},
+                supabase_url,
+                supabase_key
+            )
+        else:
+            # Новая отметка, либо +1 к reported_count существующей
+            merged = _merge_incompatibilities(
+                mod_source_id,
+                {'_OUTDATED_': {'reason': reason, 'type': 'outdated', 'auto_added': True, 'reported_count': 1}},
+                supabase_url,
+                supabase_key,
+                increment_key='_OUTDATED_',
+                latest_reason=reason
+            )
+        
+        if merged is not None:
+            if merged:
+                logger.info("   ✅ [DB Update] Successfully marked mod '%s' as outdated", mod_source_id)
+            return merged
         
         # Получаем текущие incompatibilities
-        response = requests.get(
+        response = SESSION.get(
             f'{supabase_url}/rest/v1/mods',
-            params={'source_id': f'eq.{mod_source_id}', 'select': 'id,source_id,name,incompatibilities'},
+            params={'source_id': f'eq.{mod_source_id}', 'select': 'name,incompatibilities'},
             headers={
                 'apikey': supabase_key,
                 'Authorization': f'Bearer {supabase_key}'
@@ -435,16 +647,16 @@ def mark_mod_as_outdated(
         )
         
         if response.status_code != 200:
-            print(f"   ❌ [DB Query] Failed to fetch mod: HTTP {response.status_code}")
+            logger.error("   ❌ [DB Query] Failed to fetch mod: HTTP %s", response.status_code)
             return False
             
         data = response.json()
         if not data:
-            print(f"   ❌ [DB Query] Mod with source_id '{mod_source_id}' not found in database")
+            logger.error("   ❌ [DB Query] Mod with source_id '%s' not found in database", mod_source_id)
             return False
         
         mod_data = data[0]
-        print(f"   ✅ [DB Query] Found mod: {mod_data.get('name')} ({mod_data.get('source_id')})")
+        logger.debug("   ✅ [DB Query] Found mod: %s (%s)", mod_data.get('name'), mod_source_id)
         
         current_incompats = mod_data.get('incompatibilities')
         
@@ -452,7 +664,7 @@ def mark_mod_as_outdated(
         if current_incompats is None:
             current_incompats = {}
         elif isinstance(current_incompats, str):
-            current_incompats = json.loads(current_incompats) if current_incompats else {}
+            current_incompats = json_loads(current_incompats) if current_incompats else {}
         elif not isinstance(current_incompats, dict):
             current_incompats = {}
         
@@ -466,12 +678,12 @@ def mark_mod_as_outdated(
                 'reported_count': 100,
                 'god_mode': True
             }
-            print(f"   👑 [GOD MODE] Instantly blacklisted mod with reported_count=100")
+            logger.info("   👑 [GOD MODE] Instantly blacklisted mod with reported_count=100")
         elif '_OUTDATED_' in current_incompats:
             # Увеличиваем счетчик жалоб
             current_incompats['_OUTDATED_']['reported_count'] = current_incompats['_OUTDATED_'].get('reported_count', 1) + 1
             current_incompats['_OUTDATED_']['latest_reason'] = reason
-            print(f"   🔁 [DB Update] Incremented outdated reports: {current_incompats['_OUTDATED_']['reported_count']}")
+            logger.info("   🔁 [DB Update] Incremented outdated reports: %s", current_incompats['_OUTDATED_']['reported_count'])
         else:
             # Создаем новую отметку
             current_incompats['_OUTDATED_'] = {
@@ -480,10 +692,10 @@ def mark_mod_as_outdated(
                 'auto_added': True,
                 'reported_count': 1
             }
-            print(f"   ➕ [DB Update] Created new outdated marker")
+            logger.info("   ➕ [DB Update] Created new outdated marker")
         
         # Обновляем БД
-        update_response = requests.patch(
+        update_response = SESSION.patch(
             f'{supabase_url}/rest/v1/mods',
             params={'source_id': f'eq.{mod_source_id}'},
             headers={
@@ -492,21 +704,20 @@ def mark_mod_as_outdated(
                 'Content-Type': 'application/json',
                 'Prefer': 'return=minimal'
             },
-            json={'incompatibilities': current_incompats},
+            data=json_dumps({'incompatibilities': current_incompats}),
             timeout=10
         )
         
         if update_response.status_code in [200, 204]:
-            print(f"   ✅ [DB Update] Successfully marked mod '{mod_source_id}' as outdated")
+            logger.info("   ✅ [DB Update] Successfully marked mod '%s' as outdated", mod_source_id)
+            invalidate_mod_cache(mod_source_id)
             return True
         else:
-            print(f"   ❌ [DB Update] Failed to update: {update_response.text}")
+            logger.error("   ❌ [DB Update] Failed to update: %s", update_response.text)
             return False
         
     except Exception as e:
-        print(f"   ❌ [DB Update] Exception occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("   ❌ [DB Update] Exception occurred: %s", e)
         return False
 
 
@@ -523,12 +734,36 @@ def add_incompatibility_to_db(
     loaders: None = глобальная несовместимость, [список] = только на этих loader'ах
     """
     try:
-        print(f"   📝 [DB Update] Updating mod '{mod_source_id}' to mark incompatible with '{incompatible_with_id}'")
+        logger.info("   📝 [DB Update] Updating mod '%s' to mark incompatible with '%s'", mod_source_id, incompatible_with_id)
+        
+        # Новая несовместимость
+        incompatibility_entry = {
+            'reason': reason,
+            'type': 'user_reported',
+            'auto_added': True
+        }
+        
+        # Добавляем loaders если указаны (не глобальная)
+        if loaders:
+            incompatibility_entry['loaders'] = loaders
+        
+        merged = _merge_incompatibilities(
+            mod_source_id,
+            {incompatible_with_id: incompatibility_entry},
+            supabase_url,
+            supabase_key
+        )
+        
+        if merged is not None:
+            if merged:
+                logger.debug("   💾 [DB Update] Adding incompatibility: %s -> %s", incompatible_with_id, reason)
+                logger.info("   ✅ [DB Update] Successfully updated mod '%s'", mod_source_id)
+            return merged
         
         # Получаем текущие incompatibilities
-        response = requests.get(
+        response = SESSION.get(
             f'{supabase_url}/rest/v1/mods',
-            params={'source_id': f'eq.{mod_source_id}', 'select': 'id,source_id,name,incompatibilities'},
+            params={'source_id': f'eq.{mod_source_id}', 'select': 'name,incompatibilities'},
             headers={
                 'apikey': supabase_key,
                 'Authorization': f'Bearer {supabase_key}'
@@ -536,19 +771,19 @@ def add_incompatibility_to_db(
             timeout=10
         )
         
-        print(f"   📡 [DB Query] GET status: {response.status_code}")
+        logger.debug("   📡 [DB Query] GET status: %s", response.status_code)
         
         if response.status_code != 200:
-            print(f"   ❌ [DB Query] Failed to fetch mod: HTTP {response.status_code}")
+            logger.error("   ❌ [DB Query] Failed to fetch mod: HTTP %s", response.status_code)
             return False
             
         data = response.json()
         if not data:
-            print(f"   ❌ [DB Query] Mod with source_id '{mod_source_id}' not found in database")
+            logger.error("   ❌ [DB Query] Mod with source_id '%s' not found in database", mod_source_id)
             return False
         
         mod_data = data[0]
-        print(f"   ✅ [DB Query] Found mod: {mod_data.get('name')} ({mod_data.get('source_id')})")
+        logger.debug("   ✅ [DB Query] Found mod: %s (%s)", mod_data.get('name'), mod_source_id)
         
         current_incompats = mod_data.get('incompatibilities')
         
@@ -556,30 +791,20 @@ def add_incompatibility_to_db(
         if current_incompats is None:
             current_incompats = {}
         elif isinstance(current_incompats, str):
-            current_incompats = json.loads(current_incompats) if current_incompats else {}
+            current_incompats = json_loads(current_incompats) if current_incompats else {}
         elif not isinstance(current_incompats, dict):
             current_incompats = {}
         
-        print(f"   📊 [DB Update] Current incompatibilities count: {len(current_incompats)}")
+        logger.debug("   📊 [DB Update] Current incompatibilities count: %s", len(current_incompats))
         
         # Добавляем новую несовместимость
-        incompatibility_entry = {
-            'reason': reason,
-            'type': 'user_reported',
-            'auto_added': True
-        }
-        
-        # Добавляем loaders если указаны (не глобальная)
-        if loaders:
-            incompatibility_entry['loaders'] = loaders
-        
         current_incompats[incompatible_with_id] = incompatibility_entry
         
-        print(f"   📊 [DB Update] New incompatibilities count: {len(current_incompats)}")
-        print(f"   💾 [DB Update] Adding incompatibility: {incompatible_with_id} -> {reason}")
+        logger.debug("   📊 [DB Update] New incompatibilities count: %s", len(current_incompats))
+        logger.debug("   💾 [DB Update] Adding incompatibility: %s -> %s", incompatible_with_id, reason)
         
         # Обновляем БД
-        update_response = requests.patch(
+        update_response = SESSION.patch(
             f'{supabase_url}/rest/v1/mods',
             params={'source_id': f'eq.{mod_source_id}'},
             headers={
@@ -588,21 +813,20 @@ def add_incompatibility_to_db(
                 'Content-Type': 'application/json',
                 'Prefer': 'return=minimal'
             },
-            json={'incompatibilities': current_incompats},
+            data=json_dumps({'incompatibilities': current_incompats}),
             timeout=10
         )
         
-        print(f"   📡 [DB Update] PATCH status: {update_response.status_code}")
+        logger.debug("   📡 [DB Update] PATCH status: %s", update_response.status_code)
         
         if update_response.status_code in [200, 204]:
-            print(f"   ✅ [DB Update] Successfully updated mod '{mod_source_id}'")
+            logger.info("   ✅ [DB Update] Successfully updated mod '%s'", mod_source_id)
+            invalidate_mod_cache(mod_source_id)
             return True
         else:
-            print(f"   ❌ [DB Update] Failed to update: {update_response.text}")
+            logger.error("   ❌ [DB Update] Failed to update: %s", update_response.text)
             return False
         
     except Exception as e:
-        print(f"   ❌ [DB Update] Exception occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("   ❌ [DB Update] Exception occurred: %s", e)
         return False
@@ -3,48 +3,144 @@
 OPTIMIZED: Local prefiltering + single AI call
 """
 
-import requests
+import hashlib
+import heapq
 import json
-import re
+import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from operator import itemgetter
 from typing import Dict, List, Optional
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from config import ESSENTIAL_LIBRARIES, DEEPSEEK_INPUT_COST, DEEPSEEK_OUTPUT_COST
+from supabase_http import SESSION, fetch_mods_by_source_ids, json_dumps, json_loads
+
+
+logger = logging.getLogger(__name__)
 
 # Optimization constants
 MAX_AI_CANDIDATES = 50  # было ~100, стало максимум 50
 PER_CATEGORY_LIMIT = 6   # с каждой категории берём не больше 6
 AI_TIMEOUT = 60          # было 90, стало 60
 MIN_CAP_INTERSECTION = 1 # минимум пересечений capabilities для matching
+RELEVANCE_WEIGHT = 3.0   # вес семантической релевантности из hybrid search (0..1 после нормализации)
+RELEVANCE_MIN = 0.35     # порог релевантности (от лучшего кандидата) для gameplay модов в preselect
+RELEVANCE_TOP_K = MAX_AI_CANDIDATES  # самые релевантные проходят preselect независимо от порога
+ENRICH_FALLBACK_WORKERS = 16  # потоки для поштучного enrichment, если пачка не прошла
+
+# Отдельная сессия для DeepSeek в селекторе: ретраи не распространяются на другие POST общей SESSION.
+# Транзиентные 429/5xx и ошибки соединения ретраятся с экспоненциальной паузой (1s, 2s, 4s)
+# вместо ухода в fallback с худшим отбором. Read timeout не повторяется: генерация могла идти
+# (и тарифицироваться) на стороне DeepSeek, а повтор удвоил бы паузу в SSE-стриме сборки.
+# Retry-After не учитывается - большой заголовок не должен парковать поток воркера
+_DEEPSEEK_SESSION = requests.Session()
+_DEEPSEEK_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        connect=3,
+        read=0,
+        status=3,
+        backoff_factor=1.0,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['POST']),
+        respect_retry_after_header=False,
+        raise_on_status=False  # после последней попытки - обычный ответ, ошибку разбирает вызывающий код
+    )
+))
+
+# Процессный кэш ответов AI: ключ - SHA-256 от (system_prompt, user_message), TTL + LRU-лимит
+SELECTION_CACHE_TTL = 600  # секунд
+SELECTION_CACHE_MAXSIZE = 256
+_SELECTION_CACHE: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (timestamp, selection)
+_selection_cache_lock = threading.Lock()
+
+
+# Теги кандидата, которые показываются AI в промпте
+_IMPORTANT_TAGS = frozenset({'client-only', 'server-only', 'universal', 'library', 'api', 'essential-mod', 'modpack-essential'})
+COMPACT_SUMMARY_CHARS = 100  # summary в compact формате кандидатов
+
+# Признаки библиотеки (константы - не пересоздаются на каждый вызов)
+_LIBRARY_CAPS = frozenset({'api.exposed', 'dependency.library', 'compatibility.bridge', 'compatibility.integration'})
+_LIBRARY_TAGS = frozenset({'library', 'api', 'dependency', 'core-mod'})
+# Теги, по которым ensure_libraries считает, что библиотеки в подборке уже есть
+_LIBRARY_PRESENT_TAGS = frozenset({'library', 'api', 'dependency'})
+_ESSENTIAL_LIBRARY_SLUGS = frozenset(ESSENTIAL_LIBRARIES)
 
 
 def _is_library_mod(mod: Dict) -> bool:
     """Проверяет является ли мод библиотекой"""
-    caps = set(mod.get('capabilities', []))
-    tags = set(mod.get('tags', []))
-    return bool(
-        caps & {'api.exposed', 'dependency.library', 'compatibility.bridge', 'compatibility.integration'}
-        or tags & {'library', 'api', 'dependency', 'core-mod'}
-    )
+    caps = mod.get('capabilities')
+    if caps and not _LIBRARY_CAPS.isdisjoint(caps):
+        return True
+    tags = mod.get('tags')
+    return bool(tags) and not _LIBRARY_TAGS.isdisjoint(tags)
+
+
+# Статическая часть system prompt - байт-в-байт одинаковая для всех вызовов.
+# Идёт первой: серверный prefix cache DeepSeek переиспользует её токены между любыми
+# запросами (и дешевле тарифицирует), переменная архитектура/reference - после неё
+_SYSTEM_PROMPT_BASE = """You are an expert Minecraft modpack curator. Your task is to select the BEST mods from candidates that match the user's request.
+
+SELECTION CRITERIA:
+1. **Relevance**: How well does the mod match user's request?
+2. **Quality**: Is the mod stable, popular, and well-maintained?
+3. **Synergy**: Do the mods work well together?
+4. **Diversity**: Avoid selecting too many similar mods
+5. **Dependencies**: ALWAYS include required libraries/APIs
+
+RULES:
+- **CRITICAL**: You MUST select close to the max_mods limit (aim for 90-100% of max)
+- If user asks for SPECIFIC mods -> prioritize exact matches
+- If user asks for a THEME -> select diverse mods fitting the theme
+- Always check for conflicts and incompatibilities
+- Prefer mods with higher downloads (more stable)
+- **CRITICAL**: ALWAYS include essential libraries (Fabric API, Cloth Config, etc.)
+- **CRITICAL**: If you see mods with 'library' or 'api' tags -> ALWAYS include them
+- Libraries should be selected FIRST before other mods
+- Better to include MORE mods than fewer (user wants a full modpack!)
+
+OUTPUT FORMAT:
+Return ONLY valid JSON (no markdown):
+{
+  "mods": [
+    {
+      "slug": "mod-slug",
+      "reason": "Why this mod was selected (short phrase, max 12 words)"
+    }
+  ],
+  "explanation": "Overall explanation of the selection (1-2 sentences)"
+}"""
+
+
+def _mod_downloads(mod: Dict) -> int:
+    """Downloads мода (поле зависит от источника данных)"""
+    return mod.get('downloads') or mod.get('total_downloads') or mod.get('modrinth_downloads') or 0
+
 
+def _popularity_score(downloads: int) -> float:
+    """Балл популярности (downloads) - до 3 баллов с потолком"""
+    return min(downloads / 100_000, 3.0)
 
-def _score_mod_for_category(mod: Dict, category: Dict) -> float:
+
+def _score_mod_for_category(mod_caps: set, pop_score: float, req_caps: set, pref_caps: set) -> float:
     """
     Локальный скоринг мода для категории без AI.
     Считает пересечение capabilities + популярность.
+    Множества и popularity считаются заранее - один раз на мод / категорию.
     """
-    mod_caps = set(mod.get('capabilities', []))
-    req_caps = set(category.get('required_capabilities', []))
-    pref_caps = set(category.get('preferred_capabilities', []))
-    
     # Пересечение по capabilities
     intersection_req = len(mod_caps & req_caps)
     intersection_pref = len(mod_caps & pref_caps)
     
-    # Популярность (downloads)
-    downloads = mod.get('downloads') or mod.get('total_downloads') or mod.get('modrinth_downloads') or 0
-    pop_score = min(downloads / 100_000, 3.0)  # до 3 баллов с потолком
-    
     # Итоговый score
     score = (
         intersection_req * 5.0    # required capabilities самое важное
@@ -72,33 +168,62 @@ def _preselect_candidates_by_architecture(
     if not categories:
         return candidates[:MAX_AI_CANDIDATES]
     
-    print(f"   🔍 [Preselect] Filtering {len(candidates)} candidates by architecture...")
+    logger.info("   🔍 [Preselect] Filtering %s candidates by architecture...", len(candidates))
     
     # 1. Отделяем библиотеки - они всегда нужны
-    library_mods = [m for m in candidates if _is_library_mod(m)]
-    gameplay_mods = [m for m in candidates if not _is_library_mod(m)]
+    library_mods = []
+    gameplay_mods = []
+    for m in candidates:
+        (library_mods if _is_library_mod(m) else gameplay_mods).append(m)
     
-    print(f"   📚 Found {len(library_mods)} libraries, {len(gameplay_mods)} gameplay mods")
+    logger.info("   📚 Found %s libraries, %s gameplay mods", len(library_mods), len(gameplay_mods))
     
     picked: List[Dict] = []
     picked_slugs = set()
     
+    # Релевантность запросу уже посчитана hybrid search (vector + BM25) - нормализуем к 0..1
+    # по максимуму среди кандидатов, чтобы не зависеть от шкалы fusion. Без score - 0 (как раньше)
+    raw_relevance = [m.get('_combined_score') or 0.0 for m in gameplay_mods]
+    max_relevance = max(raw_relevance, default=0.0)
+    if max_relevance > 0:
+        gameplay_rel = [r / max_relevance for r in raw_relevance]
+        
+        # Отсекаем нерелевантные запросу моды: остаются выше порога или из топ-K по релевантности
+        if len(gameplay_mods) > RELEVANCE_TOP_K:
+            top_k = set(heapq.nlargest(RELEVANCE_TOP_K, range(len(gameplay_mods)), key=gameplay_rel.__getitem__))
+            keep = [i for i, rel in enumerate(gameplay_rel) if rel >= RELEVANCE_MIN or i in top_k]
+            if len(keep) < len(gameplay_mods):
+                logger.info("   🎯 Relevance filter: %s -> %s gameplay mods", len(gameplay_mods), len(keep))
+                gameplay_mods = [gameplay_mods[i] for i in keep]
+                gameplay_rel = [gameplay_rel[i] for i in keep]
+    else:
+        gameplay_rel = [0.0] * len(gameplay_mods)
+    
+    # Capabilities, downloads и популярность - один раз на мод, а не на каждую пару (мод, категория).
+    # Хранятся в параллельных списках: сами dict'ы модов уходят в ответ API и не засоряются
+    gameplay_caps = [set(m.get('capabilities', [])) for m in gameplay_mods]
+    gameplay_downloads = [_mod_downloads(m) for m in gameplay_mods]
+    gameplay_pop = [_popularity_score(dl) for dl in gameplay_downloads]
+    
     # 2. По каждой категории берём топ подходящих модов
     for cat in categories:
+        req_list = cat.get('required_capabilities', [])
+        req_caps = set(req_list)
+        pref_caps = set(cat.get('preferred_capabilities', []))
+        
         scored = []
-        for mod in gameplay_mods:
+        for mod, mod_caps, pop_score, relevance in zip(gameplay_mods, gameplay_caps, gameplay_pop, gameplay_rel):
             if mod.get('slug') in picked_slugs:
                 continue
-            score = _score_mod_for_category(mod, cat)
-            if score < MIN_CAP_INTERSECTION and len(cat.get('required_capabilities', [])) > 0:
+            score = _score_mod_for_category(mod_caps, pop_score, req_caps, pref_caps)
+            if score < MIN_CAP_INTERSECTION and len(req_list) > 0:
                 continue  # мод не подходит под категорию
-            scored.append((score, mod))
-        
-        # Сортируем по убыванию score
-        scored.sort(key=lambda x: x[0], reverse=True)
+            # Релевантность только ранжирует прошедших фильтр категории, но не пропускает через него
+            scored.append((score + relevance * RELEVANCE_WEIGHT, mod))
         
-        # Берём топ PER_CATEGORY_LIMIT модов
-        top_mods = [m for _, m in scored[:PER_CATEGORY_LIMIT]]
+        # Берём топ PER_CATEGORY_LIMIT модов по убыванию score
+        # (nlargest - частичная сортировка; при равенстве порядок как у стабильной sort)
+        top_mods = [m for _, m in heapq.nlargest(PER_CATEGORY_LIMIT, scored, key=itemgetter(0))]
         for mod in top_mods:
             if mod.get('slug') not in picked_slugs:
                 picked.append(mod)
@@ -106,31 +231,26 @@ def _preselect_candidates_by_architecture(
     
     # 3. Если мало - добиваем популярными
     if len(picked) < max_mods:
-        rest = [m for m in gameplay_mods if m.get('slug') not in picked_slugs]
-        rest.sort(
-            key=lambda m: m.get('downloads') or m.get('total_downloads') or m.get('modrinth_downloads') or 0,
-            reverse=True
-        )
+        rest = [
+            (downloads, m) for m, downloads in zip(gameplay_mods, gameplay_downloads)
+            if m.get('slug') not in picked_slugs
+        ]
         need = max_mods - len(picked)
-        picked.extend(rest[:need])
+        picked.extend(m for _, m in heapq.nlargest(need, rest, key=itemgetter(0)))
     
-    # 4. Добавляем библиотеки в начало (но не все, максимум 15)
-    trimmed_libraries = library_mods[:15]
-    result = trimmed_libraries + picked
-    
-    # 5. Дедупликация и обрезка до MAX_AI_CANDIDATES
-    deduped = []
-    seen = set()
-    for m in result:
+    # 4. Библиотеки идут в начало (но не все, максимум 15)
+    # 5. Дедупликация и обрезка до MAX_AI_CANDIDATES - один проход, dict хранит порядок вставки
+    deduped_by_slug = {}
+    for m in chain(library_mods[:15], picked):
         slug = m.get('slug') or m.get('project_id') or m.get('name')
-        if slug in seen:
+        if slug in deduped_by_slug:
             continue
-        seen.add(slug)
-        deduped.append(m)
-        if len(deduped) >= MAX_AI_CANDIDATES:
+        deduped_by_slug[slug] = m
+        if len(deduped_by_slug) >= MAX_AI_CANDIDATES:
             break
+    deduped = list(deduped_by_slug.values())
     
-    print(f"   ✂️  Preselected {len(deduped)} candidates (was {len(candidates)})")
+    logger.info("   ✂️  Preselected %s candidates (was %s)", len(deduped), len(candidates))
     return deduped
 
 
@@ -165,87 +285,40 @@ def select_final_mods(
         Dict с выбранными модами и explanation
     """
     start_time = time.time()
-    print(f"🎯 [Final Selector] Selecting best {max_mods} mods from {len(candidates)} candidates...")
+    logger.info("🎯 [Final Selector] Selecting best %s mods from %s candidates...", max_mods, len(candidates))
     
     # BASELINE: Автоматически добавляем baseline моды (они не считаются в max_mods)
-    baseline_added = []
-    baseline_source_ids = set()
+    # Индекс кандидатов по source_id - один раз на вызов, O(1) поиск baseline мода
+    candidates_by_sid: Dict[str, Dict] = {}
+    for mod in candidates:
+        if mod.get('source_id'):
+            candidates_by_sid.setdefault(mod['source_id'], mod)  # первый, как при линейном поиске
     
     if baseline_mods:
-        print(f"   📌 [Baseline] Adding {len(baseline_mods)} baseline mods automatically...")
+        logger.info("   📌 [Baseline] Adding %s baseline mods automatically...", len(baseline_mods))
         
-        # Создаём set source_id кандидатов для быстрого поиска
-        candidates_source_ids = {mod.get('source_id') for mod in candidates if mod.get('source_id')}
-        
-        for baseline_mod in baseline_mods:
-            baseline_source_id = baseline_mod.get('source_id')
-            if not baseline_source_id:
-                continue
-            
-            # Проверяем: есть ли baseline мод уже в candidates?
-            baseline_in_candidates = any(
-                mod.get('source_id') == baseline_source_id 
-                for mod in candidates
-            )
-            
-            if baseline_in_candidates:
-                # Baseline мод уже в candidates - он будет выбран автоматически
-                baseline_source_ids.add(baseline_source_id)
-                baseline_added.append(baseline_mod['name'])
-            else:
-                # Baseline мод не в candidates - добавляем его как "скрытый" кандидат
-                # (он будет добавлен в финальный результат автоматически)
-                baseline_source_ids.add(baseline_source_id)
-                baseline_added.append(baseline_mod['name'])
+        # Есть baseline мод в candidates или нет - в финальный результат он попадёт в любом случае
+        baseline_added = [m['name'] for m in baseline_mods if m.get('source_id')]
         
         if baseline_added:
-            print(f"   ✅ Baseline mods to include: {', '.join(baseline_added[:5])}")
+            logger.info("   ✅ Baseline mods to include: %s", ', '.join(baseline_added[:5]))
             if len(baseline_added) > 5:
-                print(f"      ... and {len(baseline_added) - 5} more")
-            print(f"   ℹ️  Baseline mods are NOT counted in mod limit (they're the foundation)")
-    
-    # Логируем все кандидаты для отладки
-    print(f"   📋 All candidates ({len(candidates)} mods):")
-    candidates_slugs = []
-    for i, mod in enumerate(candidates[:20], 1):  # Показываем первые 20
-        slug = mod.get('slug', 'unknown')
-        name = mod.get('name', 'unknown')
-        candidates_slugs.append(slug)
-        print(f"      {i}. {name} ({slug})")
-    if len(candidates) > 20:
-        print(f"      ... and {len(candidates) - 20} more")
+                logger.info("      ... and %s more", len(baseline_added) - 5)
+            logger.info("   ℹ️  Baseline mods are NOT counted in mod limit (they're the foundation)")
+    
+    # Логируем все кандидаты для отладки (поштучный список - только на DEBUG)
+    logger.info("   📋 All candidates (%s mods)", len(candidates))
+    if logger.isEnabledFor(logging.DEBUG):
+        _log_mod_list(candidates, 20)
     
     # Fast path 1: если кандидатов меньше чем надо - возвращаем все
     if len(candidates) <= max_mods:
-        print(f"   ⚡ Fast path: {len(candidates)} <= {max_mods}, returning all candidates")
+        logger.info("   ⚡ Fast path: %s <= %s, returning all candidates", len(candidates), max_mods)
         
         # BASELINE: Добавляем baseline моды если их нет
         result_mods = candidates.copy()
         if baseline_mods:
-            candidates_source_ids = {mod.get('source_id') for mod in candidates if mod.get('source_id')}
-            for baseline_mod in baseline_mods:
-                baseline_source_id = baseline_mod.get('source_id')
-                if baseline_source_id and baseline_source_id not in candidates_source_ids:
-                    # Ищем в candidates или создаём запись
-                    baseline_found = None
-                    for candidate in candidates:
-                        if candidate.get('source_id') == baseline_source_id:
-                            baseline_found = candidate.copy()
-                            break
-                    
-                    if baseline_found:
-                        baseline_found['_added_as_baseline'] = True
-                        result_mods.append(baseline_found)
-                    else:
-                        baseline_entry = {
-                            'source_id': baseline_source_id,
-                            'name': baseline_mod['name'],
-                            'slug': baseline_mod.get('slug', ''),
-                            'capabilities': baseline_mod.get('capabilities', []),
-                            'tags': baseline_mod.get('tags', []),
-                            '_added_as_baseline': True
-                        }
-                        result_mods.append(baseline_entry)
+            _merge_baseline(result_mods, baseline_mods, candidates_by_sid)
         
         return {
             'mods': result_mods,
@@ -266,47 +339,18 @@ def select_final_mods(
     )
     
     # Логируем preselected кандидаты
-    print(f"   📋 Preselected candidates ({len(trimmed_candidates)} mods):")
-    preselected_slugs = []
-    for i, mod in enumerate(trimmed_candidates[:20], 1):  # Показываем первые 20
-        slug = mod.get('slug', 'unknown')
-        name = mod.get('name', 'unknown')
-        preselected_slugs.append(slug)
-        print(f"      {i}. {name} ({slug})")
-    if len(trimmed_candidates) > 20:
-        print(f"      ... and {len(trimmed_candidates) - 20} more")
+    logger.info("   📋 Preselected candidates (%s mods)", len(trimmed_candidates))
+    if logger.isEnabledFor(logging.DEBUG):
+        _log_mod_list(trimmed_candidates, 20)
     
     # Fast path 2: после предвыбора всё влезает - skip AI
     if len(trimmed_candidates) <= max_mods:
-        print(f"   ⚡ Fast path 2: after preselect {len(trimmed_candidates)} <= {max_mods}, skipping AI")
+        logger.info("   ⚡ Fast path 2: after preselect %s <= %s, skipping AI", len(trimmed_candidates), max_mods)
         selected = ensure_libraries(trimmed_candidates, candidates)
         
         # BASELINE: Добавляем baseline моды если их нет
         if baseline_mods:
-            selected_source_ids = {mod.get('source_id') for mod in selected if mod.get('source_id')}
-            for baseline_mod in baseline_mods:
-                baseline_source_id = baseline_mod.get('source_id')
-                if baseline_source_id and baseline_source_id not in selected_source_ids:
-                    # Ищем в candidates
-                    baseline_found = None
-                    for candidate in candidates:
-                        if candidate.get('source_id') == baseline_source_id:
-                            baseline_found = candidate.copy()
-                            break
-                    
-                    if baseline_found:
-                        baseline_found['_added_as_baseline'] = True
-                        selected.append(baseline_found)
-                    else:
-                        baseline_entry = {
-                            'source_id': baseline_source_id,
-                            'name': baseline_mod['name'],
-                            'slug': baseline_mod.get('slug', ''),
-                            'capabilities': baseline_mod.get('capabilities', []),
-                            'tags': baseline_mod.get('tags', []),
-                            '_added_as_baseline': True
-                        }
-                        selected.append(baseline_entry)
+            _merge_baseline(selected, baseline_mods, candidates_by_sid)
         
         return {
             'mods': selected,
@@ -320,13 +364,13 @@ def select_final_mods(
         }
     
     # Формируем промпт (теперь гораздо короче)
-    candidates_text = format_candidates(trimmed_candidates)  # было [:100], стало все
+    candidates_text = format_candidates(trimmed_candidates, compact=True)  # было [:100], стало все
     
     # Добавляем reference context или planned architecture
     reference_section = ""
     
     if planned_architecture:
-        print(f"   🏗️  Using planned architecture ({len(planned_architecture.get('categories', []))} categories)")
+        logger.info("   🏗️  Using planned architecture (%s categories)", len(planned_architecture.get('categories', [])))
         arch_lines = ["PLANNED MODPACK ARCHITECTURE:"]
         
         for cat in planned_architecture.get('categories', []):
@@ -352,7 +396,7 @@ IMPORTANT: Select mods according to this planned architecture.
 """
     
     elif reference_context:
-        print(f"   📚 Using reference architectures in AI prompt")
+        logger.info("   📚 Using reference architectures in AI prompt")
         reference_section = f"""
 
 {reference_context}
@@ -364,38 +408,11 @@ IMPORTANT: Use these reference architectures as INSPIRATION for your selection.
 - Don't copy exactly - use as a learning reference
 """
     
-    system_prompt = f"""You are an expert Minecraft modpack curator. Your task is to select the BEST mods from candidates that match the user's request.
-{reference_section}
-SELECTION CRITERIA:
-1. **Relevance**: How well does the mod match user's request?
-2. **Quality**: Is the mod stable, popular, and well-maintained?
-3. **Synergy**: Do the mods work well together?
-4. **Diversity**: Avoid selecting too many similar mods
-5. **Dependencies**: ALWAYS include required libraries/APIs
-
-RULES:
-- **CRITICAL**: You MUST select close to the max_mods limit (aim for 90-100% of max)
-- If user asks for SPECIFIC mods -> prioritize exact matches
-- If user asks for a THEME -> select diverse mods fitting the theme
-- Always check for conflicts and incompatibilities
-- Prefer mods with higher downloads (more stable)
-- **CRITICAL**: ALWAYS include essential libraries (Fabric API, Cloth Config, etc.)
-- **CRITICAL**: If you see mods with 'library' or 'api' tags -> ALWAYS include them
-- Libraries should be selected FIRST before other mods
-- Better to include MORE mods than fewer (user wants a full modpack!)
-
-OUTPUT FORMAT:
-Return ONLY valid JSON (no markdown):
-{{
-  "mods": [
-    {{
-      "slug": "mod-slug",
-      "reason": "Why this mod was selected (1-2 sentences)"
-    }}
-  ],
-  "explanation": "Overall explanation of the selection (2-3 sentences)"
-}}"""
-
+    # Переменная часть (архитектура / reference) - после общего статического префикса
+    system_prompt = _SYSTEM_PROMPT_BASE
+    if reference_section:
+        system_prompt += "\n\n" + reference_section.strip() + "\n"
+    
     user_message = f"""USER REQUEST: \"{user_prompt}\"
 Max mods to select: {max_mods}
 
@@ -418,60 +435,33 @@ Select the best mods that:
 Return your selection in JSON format."""
 
     try:
-        response = requests.post(
-            'https://api.deepseek.com/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {deepseek_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'deepseek-chat',
-                'messages': [
-                    {'role': 'system', 'content': system_prompt},
-                    {'role': 'user', 'content': user_message}
-                ],
-                'temperature': 0.2,
-                'max_tokens': 2000  # было 4000, стало 2000 (меньше кандидатов)
-            },
-            timeout=AI_TIMEOUT  # 60s вместо 90s
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"DeepSeek API error: {response.status_code} - {response.text}")
-        
-        result = response.json()
-        content = result['choices'][0]['message']['content'].strip()
-        
-        # Извлекаем инфо о токенах
-        usage = result.get('usage', {})
-        prompt_tokens = usage.get('prompt_tokens', 0)
-        completion_tokens = usage.get('completion_tokens', 0)
-        total_tokens = usage.get('total_tokens', 0)
-        cost = (prompt_tokens * DEEPSEEK_INPUT_COST / 1_000_000) + (completion_tokens * DEEPSEEK_OUTPUT_COST / 1_000_000)
-        
-        print(f"📥 [Final Selector] Received selection from AI")
-        print(f"   📊 Tokens: {total_tokens:,} (prompt: {prompt_tokens:,}, completion: {completion_tokens:,})")
-        print(f"   💵 Cost: ${cost:.6f}")
-        
-        # Парсим JSON
-        content = content.replace('```json', '').replace('```', '').strip()
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        
-        if not json_match:
-            raise Exception("Could not parse JSON from Final Selector")
-        
-        selection = json.loads(json_match.group())
+        # Повторный идентичный запрос (те же кандидаты, архитектура, доска, промпт) не платит
+        # за completion: ответ AI берётся из кэша, пост-обработка ниже выполняется как обычно
+        cache_key = _selection_cache_key(system_prompt, user_message)
+        selection = _selection_cache_get(cache_key)
+        
+        if selection is not None:
+            logger.info("🗄️  [Final Selector] Cache hit (%s), skipping AI call", cache_key[:12])
+            prompt_tokens = completion_tokens = total_tokens = 0
+            cost = 0.0
+        else:
+            selection, prompt_tokens, completion_tokens, total_tokens, cost = _request_selection(
+                system_prompt, user_message, deepseek_key
+            )
+            # Пустой/битый ответ не кэшируем - следующий запрос получит шанс на нормальный
+            if isinstance(selection, dict) and selection.get('mods'):
+                _selection_cache_put(cache_key, selection)
         
         # Детальное логирование ответа AI
-        print(f"📋 [Final Selector] AI Response:")
-        print(f"   Mods in response: {len(selection.get('mods', []))}")
-        ai_selected_slugs = []
+        logger.info("📋 [Final Selector] AI Response:")
+        logger.info("   Mods in response: %s", len(selection.get('mods', [])))
         if len(selection.get('mods', [])) > 0:
-            ai_selected_slugs = [m.get('slug') for m in selection.get('mods', [])]
-            print(f"   Mod slugs: {ai_selected_slugs}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   Mod slugs: %s", [m.get('slug') for m in selection.get('mods', [])])
         else:
-            print(f"   ⚠️  AI returned EMPTY mods array!")
-            print(f"   Full response: {json.dumps(selection, indent=2)}")
+            logger.warning("   ⚠️  AI returned EMPTY mods array!")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   Full response: %s", json.dumps(selection, indent=2))
         
         # Обогащаем данными из trimmed_candidates (не из всех candidates)
         candidates_dict = {m['slug']: m for m in trimmed_candidates}
@@ -488,66 +478,28 @@ Return your selection in JSON format."""
                 missing_slugs.append(slug)
         
         if missing_slugs:
-            print(f"   ⚠️  AI selected {len(missing_slugs)} mods not in preselected candidates: {missing_slugs}")
+            logger.warning("   ⚠️  AI selected %s mods not in preselected candidates: %s", len(missing_slugs), missing_slugs)
         
-        print(f"✅ [Final Selector] Selected {len(selected_mods)} mods")
+        logger.info("✅ [Final Selector] Selected %s mods", len(selected_mods))
         
         # BASELINE: Добавляем baseline моды автоматически (если их ещё нет)
         if baseline_mods:
-            selected_source_ids = {mod.get('source_id') for mod in selected_mods if mod.get('source_id')}
-            
-            for baseline_mod in baseline_mods:
-                baseline_source_id = baseline_mod.get('source_id')
-                if not baseline_source_id:
-                    continue
-                
-                # Если baseline мод уже выбран - пропускаем
-                if baseline_source_id in selected_source_ids:
-                    continue
-                
-                # Ищем baseline мод в candidates (для получения полных данных)
-                baseline_in_candidates = None
-                for candidate in candidates:
-                    if candidate.get('source_id') == baseline_source_id:
-                        baseline_in_candidates = candidate.copy()
-                        break
-                
-                if baseline_in_candidates:
-                    # Используем данные из candidates
-                    baseline_in_candidates['_added_as_baseline'] = True
-                    selected_mods.append(baseline_in_candidates)
-                    print(f"   📌 Added baseline mod: {baseline_mod['name']}")
-                else:
-                    # Baseline мод не в candidates - создаём минимальную запись
-                    baseline_entry = {
-                        'source_id': baseline_source_id,
-                        'name': baseline_mod['name'],
-                        'slug': baseline_mod.get('slug', ''),
-                        'capabilities': baseline_mod.get('capabilities', []),
-                        'tags': baseline_mod.get('tags', []),
-                        '_added_as_baseline': True
-                    }
-                    selected_mods.append(baseline_entry)
-                    print(f"   📌 Added baseline mod (not in candidates): {baseline_mod['name']}")
+            _merge_baseline(selected_mods, baseline_mods, candidates_by_sid)
         
-        # Логируем пропущенные моды (были в preselected, но не выбраны AI)
-        selected_slugs_set = {m.get('slug') for m in selected_mods}
-        skipped_mods = [m for m in trimmed_candidates if m.get('slug') not in selected_slugs_set]
-        if skipped_mods:
-            print(f"   📊 Skipped {len(skipped_mods)} mods from preselected (not chosen by AI):")
-            for mod in skipped_mods[:10]:  # Показываем первые 10
-                slug = mod.get('slug', 'unknown')
-                name = mod.get('name', 'unknown')
-                print(f"      - {name} ({slug})")
-            if len(skipped_mods) > 10:
-                print(f"      ... and {len(skipped_mods) - 10} more")
+        # Логируем пропущенные моды (были в preselected, но не выбраны AI) - только на DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            selected_slugs_set = {m.get('slug') for m in selected_mods}
+            skipped_mods = [m for m in trimmed_candidates if m.get('slug') not in selected_slugs_set]
+            if skipped_mods:
+                logger.debug("   📊 Skipped %s mods from preselected (not chosen by AI):", len(skipped_mods))
+                _log_mod_list(skipped_mods, 10)
         
         # Автоматически добавляем критичные библиотеки если их нет
         selected_mods = ensure_libraries(selected_mods, trimmed_candidates)
-        print(f"📚 [Final Selector] After ensuring libraries: {len(selected_mods)} mods")
+        logger.info("📚 [Final Selector] After ensuring libraries: %s mods", len(selected_mods))
         
         elapsed = time.time() - start_time
-        print(f"   ⏱️  Selection took {elapsed:.2f}s (optimized)")
+        logger.info("   ⏱️  Selection took %.2fs (optimized)", elapsed)
         
         return {
             'mods': selected_mods,
@@ -562,47 +514,211 @@ Return your selection in JSON format."""
         }
         
     except Exception as e:
-        print(f"❌ [Final Selector] Error: {e}")
+        logger.error("❌ [Final Selector] Error: %s", e)
         # Fallback: берём из trimmed_candidates (они уже отфильтрованы)
-        print(f"⚠️  [Final Selector] Using fallback selection from preselected candidates")
+        logger.warning("⚠️  [Final Selector] Using fallback selection from preselected candidates")
         return fallback_selection(trimmed_candidates, max_mods, user_prompt)
 
 
-def format_candidates(candidates: List[Dict]) -> str:
+def _log_mod_list(mods: List[Dict], limit: int) -> None:
+    """DEBUG-список первых limit модов (вызывать под logger.isEnabledFor(logging.DEBUG))"""
+    for i, mod in enumerate(mods[:limit], 1):
+        logger.debug("      %s. %s (%s)", i, mod.get('name', 'unknown'), mod.get('slug', 'unknown'))
+    if len(mods) > limit:
+        logger.debug("      ... and %s more", len(mods) - limit)
+
+
+def _merge_baseline(
+    result_mods: List[Dict],
+    baseline_mods: List[Dict],
+    candidates_by_sid: Dict[str, Dict]
+) -> None:
     """
-    Форматирует кандидатов для промпта
+    Дописывает в result_mods (in place) baseline моды, которых там ещё нет.
+    Полные данные берутся из кандидатов по source_id, иначе - минимальная запись
     """
-    lines = []
-    for i, mod in enumerate(candidates, 1):
-        lines.append(f"{i}. [{mod['slug']}] {mod['name']}")
-        
-        # Используем summary (более точное чем description)
-        summary = mod.get('summary', '')
-        if summary:
-            lines.append(f"   Summary: {summary[:200]}")
-        else:
-            # Fallback если summary нет
-            lines.append(f"   Description: {mod.get('description', '')[:200]}")
-        
-        # Используем modrinth_categories + важные tags
-        mod_categories = mod.get('modrinth_categories', [])
-        mod_tags = mod.get('tags', [])
-        lines.append(f"   Categories: {', '.join(mod_categories[:3])}")
+    present_source_ids = {mod.get('source_id') for mod in result_mods if mod.get('source_id')}
+    
+    for baseline_mod in baseline_mods:
+        baseline_source_id = baseline_mod.get('source_id')
+        if not baseline_source_id or baseline_source_id in present_source_ids:
+            continue
         
-        # Показываем важные теги
-        important_tags = [t for t in mod_tags if t in ['client-only', 'server-only', 'universal', 'library', 'api', 'essential-mod', 'modpack-essential']]
-        if important_tags:
-            lines.append(f"   Tags: {', '.join(important_tags[:5])}")
+        candidate = candidates_by_sid.get(baseline_source_id)
         
-        lines.append(f"   Downloads: {mod.get('downloads', 0):,}")
+        if candidate is not None:
+            # Используем данные из candidates
+            baseline_found = candidate.copy()
+            baseline_found['_added_as_baseline'] = True
+            result_mods.append(baseline_found)
+            logger.info("   📌 Added baseline mod: %s", baseline_mod['name'])
+        else:
+            # Baseline мод не в candidates - создаём минимальную запись
+            result_mods.append({
+                'source_id': baseline_source_id,
+                'name': baseline_mod['name'],
+                'slug': baseline_mod.get('slug', ''),
+                'capabilities': baseline_mod.get('capabilities', []),
+                'tags': baseline_mod.get('tags', []),
+                '_added_as_baseline': True
+            })
+            logger.info("   📌 Added baseline mod (not in candidates): %s", baseline_mod['name'])
+
+
+def _request_selection(system_prompt: str, user_message: str, deepseek_key: str) -> tuple:
+    """
+    Запрос отбора в DeepSeek
+    
+    Returns:
+        (selection, prompt_tokens, completion_tokens, total_tokens, cost_usd)
+    """
+    response = _DEEPSEEK_SESSION.post(
+        'https://api.deepseek.com/v1/chat/completions',
+        headers={
+            'Authorization': f'Bearer {deepseek_key}',
+            'Content-Type': 'application/json'
+        },
+        data=json_dumps({
+            'model': 'deepseek-chat',
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_message}
+            ],
+            'temperature': 0.2,
+            'max_tokens': 2000,  # было 4000, стало 2000 (меньше кандидатов)
+            'response_format': {'type': 'json_object'}  # JSON mode: ответ - сразу валидный объект
+        }),
+        timeout=AI_TIMEOUT  # 60s вместо 90s
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"DeepSeek API error: {response.status_code} - {response.text}")
+    
+    result = json_loads(response.content)
+    content = result['choices'][0]['message']['content'].strip()
+    
+    # Извлекаем инфо о токенах
+    usage = result.get('usage', {})
+    prompt_tokens = usage.get('prompt_tokens', 0)
+    completion_tokens = usage.get('completion_tokens', 0)
+    total_tokens = usage.get('total_tokens', 0)
+    cost = (prompt_tokens * DEEPSEEK_INPUT_COST / 1_000_000) + (completion_tokens * DEEPSEEK_OUTPUT_COST / 1_000_000)
+    
+    logger.info("📥 [Final Selector] Received selection from AI")
+    logger.info("   📊 Tokens: %s (prompt: %s, completion: %s)", format(total_tokens, ','), format(prompt_tokens, ','), format(completion_tokens, ','))
+    if 'prompt_cache_hit_tokens' in usage:
+        logger.info("   🗄️  Prompt cache: %s hit / %s miss", format(usage['prompt_cache_hit_tokens'], ','), format(usage.get('prompt_cache_miss_tokens', 0), ','))
+    logger.info("   💵 Cost: $%.6f", cost)
+    
+    # Парсим JSON: в JSON mode content уже валидный объект.
+    # Вырезание из markdown/текста - только запасной путь для ответов без JSON mode
+    try:
+        selection = json_loads(content)
+    except ValueError:
+        # От первой '{' до последней '}' - то же, что жадный r'\{.*\}' с DOTALL, но без regex
+        content = content.replace('```json', '').replace('```', '').strip()
+        start = content.find('{')
+        end = content.rfind('}')
         
-        # Показываем score если есть
-        if '_combined_score' in mod:
-            lines.append(f"   Relevance Score: {mod['_combined_score']:.3f}")
+        if start == -1 or end <= start:
+            raise Exception("Could not parse JSON from Final Selector")
         
-        lines.append("")
+        selection = json_loads(content[start:end + 1])
+    
+    return selection, prompt_tokens, completion_tokens, total_tokens, cost
+
+
+def _selection_cache_key(system_prompt: str, user_message: str) -> str:
+    """Content-addressed ключ: одинаковые промпты = одинаковый запрос к AI"""
+    digest = hashlib.sha256()
+    digest.update(system_prompt.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(user_message.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _selection_cache_get(key: str) -> Optional[Dict]:
+    """Ответ AI из процессного кэша (None - промах или истёк TTL)"""
+    with _selection_cache_lock:
+        entry = _SELECTION_CACHE.get(key)
+        if entry is None:
+            return None
+        ts, selection = entry
+        if time.monotonic() - ts > SELECTION_CACHE_TTL:
+            del _SELECTION_CACHE[key]
+            return None
+        _SELECTION_CACHE.move_to_end(key)
+        return selection
+
+
+def _selection_cache_put(key: str, selection: Dict):
+    """Кладёт ответ AI в кэш, вытесняя самые старые записи сверх лимита"""
+    with _selection_cache_lock:
+        _SELECTION_CACHE[key] = (time.monotonic(), selection)
+        _SELECTION_CACHE.move_to_end(key)
+        while len(_SELECTION_CACHE) > SELECTION_CACHE_MAXSIZE:
+            _SELECTION_CACHE.popitem(last=False)
+
+
+def format_candidates(candidates: List[Dict], compact: bool = False) -> str:
+    """
+    Форматирует кандидатов для промпта
+    
+    compact=True - одна строка на мод (summary до COMPACT_SUMMARY_CHARS, без description,
+    downloads в тысячах): примерно вдвое меньше prompt-токенов на 50 кандидатов
+    """
+    if compact:
+        return "\n".join(_format_candidate_compact(i, mod) for i, mod in enumerate(candidates, 1))
     
-    return "\n".join(lines)
+    return "\n".join(_format_candidate(i, mod) for i, mod in enumerate(candidates, 1))
+
+
+def _format_candidate(i: int, mod: Dict) -> str:
+    """Блок кандидата в полном формате (с пустой строкой-разделителем в конце)"""
+    # Используем summary (более точное чем description), fallback - description
+    summary = mod.get('summary', '')
+    if summary:
+        text_line = f"   Summary: {summary[:200]}"
+    else:
+        text_line = f"   Description: {mod.get('description', '')[:200]}"
+    
+    # Важные теги и score - только если есть
+    important_tags = [t for t in mod.get('tags', []) if t in _IMPORTANT_TAGS]
+    tags_line = f"\n   Tags: {', '.join(important_tags[:5])}" if important_tags else ""
+    score_line = f"\n   Relevance Score: {mod['_combined_score']:.3f}" if '_combined_score' in mod else ""
+    
+    return (
+        f"{i}. [{mod['slug']}] {mod['name']}\n"
+        f"{text_line}\n"
+        f"   Categories: {', '.join(mod.get('modrinth_categories', [])[:3])}"
+        f"{tags_line}\n"
+        f"   Downloads: {mod.get('downloads', 0):,}"
+        f"{score_line}\n"
+    )
+
+
+def _format_candidate_compact(i: int, mod: Dict) -> str:
+    """Одна строка кандидата: [slug] name | категории | важные теги | downloads | score | summary"""
+    parts = [f"{i}. [{mod['slug']}] {mod['name']}"]
+    
+    mod_categories = mod.get('modrinth_categories') or []
+    if mod_categories:
+        parts.append(','.join(mod_categories[:3]))
+    
+    important_tags = [t for t in (mod.get('tags') or []) if t in _IMPORTANT_TAGS]
+    if important_tags:
+        parts.append('tags=' + ','.join(important_tags[:5]))
+    
+    parts.append(f"dl={_mod_downloads(mod) // 1000}k")
+    
+    if '_combined_score' in mod:
+        parts.append(f"score={mod['_combined_score']:.2f}")
+    
+    summary = mod.get('summary') or mod.get('description') or ''
+    if summary:
+        parts.append(summary[:COMPACT_SUMMARY_CHARS])
+    
+    return ' | '.join(parts)
 
 
 def format_current_mods(current_mods: List[str]) -> str:
@@ -619,35 +735,29 @@ def ensure_libraries(selected_mods: List[Dict], candidates: List[Dict]) -> List[
     """
     Автоматически добавляет критичные библиотеки если их нет
     """
-    essential_libraries = ESSENTIAL_LIBRARIES
-    
-    selected_slugs = {mod['slug'] for mod in selected_mods}
-    candidates_dict = {mod['slug']: mod for mod in candidates}
-    
-    # Проверяем есть ли уже библиотеки
-    has_libraries = False
-    for mod in selected_mods:
-        tags = mod.get('tags', [])
-        if 'library' in tags or 'api' in tags or 'dependency' in tags:
-            has_libraries = True
-            break
+    # Проверяем есть ли уже библиотеки (any - выход на первой найденной)
+    has_libraries = any(not _LIBRARY_PRESENT_TAGS.isdisjoint(mod.get('tags') or ()) for mod in selected_mods)
     
     # Если нет ни одной библиотеки - добавляем критичные
     if not has_libraries:
-        print("⚠️  [Library Check] No libraries found, adding essential ones...")
+        logger.warning("⚠️  [Library Check] No libraries found, adding essential ones...")
+        # Индексы строятся только здесь и только по essential slug'ам (при дублях - последний, как раньше)
+        selected_slugs = {mod['slug'] for mod in selected_mods}
+        libraries_by_slug = {mod['slug']: mod for mod in candidates if mod['slug'] in _ESSENTIAL_LIBRARY_SLUGS}
         added = 0
-        for lib_slug in essential_libraries:
-            if lib_slug not in selected_slugs and lib_slug in candidates_dict:
-                lib_mod = candidates_dict[lib_slug]
+        # Порядок добавления - как в ESSENTIAL_LIBRARIES
+        for lib_slug in ESSENTIAL_LIBRARIES:
+            if lib_slug not in selected_slugs and lib_slug in libraries_by_slug:
+                lib_mod = libraries_by_slug[lib_slug]
                 lib_mod['ai_reason'] = 'Auto-added as essential library dependency'
                 selected_mods.insert(0, lib_mod)  # Добавляем в начало
-                print(f"   + Added {lib_mod['name']}")
+                logger.info("   + Added %s", lib_mod['name'])
                 added += 1
         
         if added > 0:
-            print(f"✅ [Library Check] Added {added} essential libraries")
+            logger.info("✅ [Library Check] Added %s essential libraries", added)
     else:
-        print("✅ [Library Check] Libraries already present")
+        logger.info("✅ [Library Check] Libraries already present")
     
     return selected_mods
 
@@ -660,53 +770,70 @@ def enrich_mods_with_full_data(
     """
     Перефетчит полные данные модов из БД (включая dependencies)
     """
-    import requests
+    logger.info("💾 [Data Enrichment] Fetching full data for %s mods...", len(selected_mods))
+    
+    # Один запрос с in.(...) на чанк вместо запроса на каждый мод
+    rows_by_id, failed_ids = fetch_mods_by_source_ids(
+        [mod['source_id'] for mod in selected_mods if mod.get('source_id')],
+        supabase_url,
+        supabase_key,
+        timeout=10
+    )
     
-    print(f"💾 [Data Enrichment] Fetching full data for {len(selected_mods)} mods...")
+    # Fallback: не прошедшие пачкой - поштучно, но параллельно (задержки не суммируются)
+    if failed_ids:
+        with ThreadPoolExecutor(max_workers=min(ENRICH_FALLBACK_WORKERS, len(failed_ids))) as executor:
+            for source_id, row in zip(failed_ids, executor.map(
+                lambda sid: _fetch_mod_row(sid, supabase_url, supabase_key), failed_ids
+            )):
+                if row is not None:
+                    rows_by_id[source_id] = row
     
     enriched_mods = []
     
     for mod in selected_mods:
-        source_id = mod.get('source_id')
-        if not source_id:
-            # Если нет source_id - оставляем как есть
+        row = rows_by_id.get(mod.get('source_id'))
+        if row is None:
+            # Нет source_id или мод не нашёлся/не загрузился - оставляем как есть
             enriched_mods.append(mod)
             continue
         
-        try:
-            response = requests.get(
-                f'{supabase_url}/rest/v1/mods',
-                params={'source_id': f'eq.{source_id}', 'select': '*'},
-                headers={
-                    'apikey': supabase_key,
-                    'Authorization': f'Bearer {supabase_key}'
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    # Используем полные данные из БД
-                    full_mod = data[0]
-                    # Сохраняем AI metadata если есть
-                    if 'ai_reason' in mod:
-                        full_mod['ai_reason'] = mod['ai_reason']
-                    if '_added_as_dependency' in mod:
-                        full_mod['_added_as_dependency'] = mod['_added_as_dependency']
-                    enriched_mods.append(full_mod)
-                else:
-                    enriched_mods.append(mod)
-            else:
-                enriched_mods.append(mod)
-        except Exception as e:
-            print(f"   ⚠️  Failed to enrich {mod.get('name')}: {e}")
-            enriched_mods.append(mod)
+        # Используем полные данные из БД (копия - одна строка может понадобиться дважды)
+        full_mod = dict(row)
+        # Сохраняем AI metadata если есть
+        if 'ai_reason' in mod:
+            full_mod['ai_reason'] = mod['ai_reason']
+        if '_added_as_dependency' in mod:
+            full_mod['_added_as_dependency'] = mod['_added_as_dependency']
+        enriched_mods.append(full_mod)
     
-    print(f"✅ [Data Enrichment] Complete: {len(enriched_mods)} mods enriched")
+    logger.info("✅ [Data Enrichment] Complete: %s mods enriched", len(enriched_mods))
     return enriched_mods
 
 
+def _fetch_mod_row(source_id: str, supabase_url: str, supabase_key: str) -> Optional[Dict]:
+    """Загружает строку одного мода по source_id (None если нет или ошибка)"""
+    try:
+        response = SESSION.get(
+            f'{supabase_url}/rest/v1/mods',
+            params={'source_id': f'eq.{source_id}', 'select': '*'},
+            headers={
+                'apikey': supabase_key,
+                'Authorization': f'Bearer {supabase_key}'
+            },
+            timeout=10
+        )
+        
+        if response.status_code == 200:
+            data = json_loads(response.content)
+            if data:
+                return data[0]
+    except Exception as e:
+        logger.warning("   ⚠️  Failed to enrich %s: %s", source_id, e)
+    
+    return None
+
+
 def fallback_selection(candidates: List[Dict], max_mods: int, user_prompt: str) -> Dict:
     """
     Простой fallback если AI не сработал
@@ -15,6 +15,9 @@ from config import BM25_K1, BM25_B, CONNECTOR_MODS, CATEGORY_SYNONYMS
 # FFAPI source_id (Forgified Fabric API) - проблемный мод для NeoForge
 FFAPI_SOURCE_ID = 'Aqlf1Shp'
 
+# Константа сглаживания Reciprocal Rank Fusion (стандартное значение из литературы)
+RRF_K = 60
+
 # Глобальная модель embeddings
 embedding_model = None
 
@@ -56,8 +59,8 @@ def execute_search_plan(
     mod_loader = metadata.get('mod_loader', 'fabric')
     fabric_compat_mode = metadata.get('fabric_compat_mode', False)
     
-    # Собираем результаты от всех queries
-    all_results = []
+    # Собираем результаты от всех queries - по группам (результаты, вес query) для RRF
+    result_groups = []
     
     for query_config in search_plan.get('search_queries', []):
         query_type = query_config.get('type', 'semantic')
@@ -87,17 +90,16 @@ def execute_search_plan(
             print(f"   ⚠️  Unknown query type: {query_type}")
             continue
         
-        # Применяем вес к scores
+        # Вес query применяется при fusion (к рангу), а не к сырому score
         for mod in results:
-            mod['_search_score'] = mod.get('_search_score', 1.0) * weight
             mod['_search_type'] = query_type
         
-        all_results.extend(results)
+        result_groups.append((results, weight))
         print(f"      → Found {len(results)} mods")
     
-    # Объединяем результаты (Reciprocal Rank Fusion - упрощённая версия)
-    print(f"🔗 [Hybrid Search] Fusing {len(all_results)} results...")
-    fused_results = fuse_results(all_results)
+    # Объединяем результаты (Reciprocal Rank Fusion)
+    print(f"🔗 [Hybrid Search] Fusing {sum(len(results) for results, _ in result_groups)} results...")
+    fused_results = fuse_results(result_groups)
     
     print(f"   → {len(fused_results)} unique mods after fusion")
     
@@ -382,32 +384,45 @@ def calculate_bm25_scores(documents: List[Dict], query_terms: List[str], k1: flo
     return documents
 
 
-def fuse_results(results: List[Dict]) -> List[Dict]:
+def fuse_results(result_groups: List[Tuple[List[Dict], float]], k: int = RRF_K) -> List[Dict]:
     """
-    Объединяет результаты от разных queries
-    Использует Reciprocal Rank Fusion (упрощённая версия)
+    Объединяет результаты от разных queries через Reciprocal Rank Fusion
+    
+    Scores semantic (1/(1+distance)) и BM25 не откалиброваны между собой - суммировать
+    их нельзя. RRF использует только ранг внутри query: weight * (k + 1) / (k + rank).
+    Множитель (k + 1) - чтобы первое место в query давало ровно weight
+    
+    Args:
+        result_groups: Список (результаты query, вес query)
+        k: Константа сглаживания RRF
     """
     # Группируем по slug
     mods_dict = {}
     
-    for mod in results:
-        slug = mod.get('slug')
-        if not slug:
-            continue
+    for results, weight in result_groups:
+        # Ранг внутри query - по убыванию собственного score (стабильно)
+        ranked = sorted(results, key=lambda m: m.get('_search_score', 0), reverse=True)
+        seen_in_query = set()
         
-        if slug not in mods_dict:
-            mods_dict[slug] = mod.copy()
-            mods_dict[slug]['_combined_score'] = 0
-            mods_dict[slug]['_search_types'] = []
-        
-        # Добавляем score
-        score = mod.get('_search_score', 0)
-        mods_dict[slug]['_combined_score'] += score
-        
-        # Запоминаем откуда пришёл результат
-        search_type = mod.get('_search_type', 'unknown')
-        if search_type not in mods_dict[slug]['_search_types']:
-            mods_dict[slug]['_search_types'].append(search_type)
+        for mod in ranked:
+            slug = mod.get('slug')
+            if not slug or slug in seen_in_query:
+                continue
+            seen_in_query.add(slug)
+            rank = len(seen_in_query)  # 1-based ранг среди уникальных модов query
+            
+            if slug not in mods_dict:
+                mods_dict[slug] = mod.copy()
+                mods_dict[slug]['_combined_score'] = 0
+                mods_dict[slug]['_search_types'] = []
+            
+            # Добавляем RRF вклад query
+            mods_dict[slug]['_combined_score'] += weight * (k + 1) / (k + rank)
+            
+            # Запоминаем откуда пришёл результат
+            search_type = mod.get('_search_type', 'unknown')
+            if search_type not in mods_dict[slug]['_search_types']:
+                mods_dict[slug]['_search_types'].append(search_type)
     
     # Сортируем по combined score
     fused = sorted(
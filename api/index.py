@@ -27,6 +27,34 @@ import uuid
 import time
 import requests
 import json
+import logging
+
+# Модули на logging (dependency_resolver, crash_doctor_sse) пишут в stdout, как и print.
+# Подробный debug-вывод включается через LOG_LEVEL=DEBUG; неизвестное значение - INFO, а не падение
+_log_level_name = (os.environ.get('LOG_LEVEL') or 'INFO').strip().upper()
+_log_level_known = True
+if _log_level_name.isdigit():
+    # Числовой уровень (LOG_LEVEL=10) - как есть
+    _log_level = int(_log_level_name)
+else:
+    # getLevelName знает и алиасы WARN/FATAL; для неизвестного имени возвращает строку
+    _log_level = logging.getLevelName(_log_level_name)
+    if not isinstance(_log_level, int):
+        _log_level = logging.INFO
+        _log_level_known = False
+
+logging.basicConfig(
+    level=_log_level,
+    format='%(message)s',
+    stream=sys.stdout
+)
+
+if not _log_level_known:
+    logging.getLogger(__name__).warning("⚠️  Unknown LOG_LEVEL=%r, using INFO", _log_level_name)
+
+# HTTP-клиенты на INFO/DEBUG логируют каждый запрос (URL Supabase/DeepSeek) и ретраи - только WARNING+
+for _noisy_logger in ('httpx', 'httpcore', 'urllib3', 'hpack', 'h2'):
+    logging.getLogger(_noisy_logger).setLevel(logging.WARNING)
 
 sys.path.insert(0, os.path.dirname(__file__))
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
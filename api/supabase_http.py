@@ -0,0 +1,100 @@
+"""
+Supabase HTTP
+Общая HTTP-сессия, JSON (orjson если есть) и выборка модов по source_id через in.(...)
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson (C-расширение) быстрее парсит ответы и сериализует тела запросов; без него - stdlib json
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+logger = logging.getLogger(__name__)
+
+# Одна сессия на процесс: keep-alive соединения переиспользуются между запросами
+# и потоками WSGI сервера - без TLS handshake на каждый вызов.
+# Ретраи только для GET (идемпотентные чтения) на 502/503/504 - POST/PATCH молча не повторяются
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=frozenset(['GET']))
+))
+
+# Размер одного in.(...) фильтра. Фильтр идёт в query string, а прокси перед PostgREST
+# обычно режут строку запроса на ~8 KB. 50 id - даже для UUID (36 символов + %2C)
+# это ~2 KB, с большим запасом под остальные параметры; короткие id Modrinth - ~0.5 KB.
+# Больше чанков - больше параллелизма (FETCH_MAX_WORKERS), а упавший чанк теряет меньше строк
+IN_FILTER_CHUNK_SIZE = 50
+# Сколько чанков запрашивается параллельно
+FETCH_MAX_WORKERS = 8
+
+
+def fetch_mods_by_source_ids(
+    source_ids: List[str],
+    supabase_url: str,
+    supabase_key: str,
+    timeout: float = 15
+) -> Tuple[Dict[str, Dict], List[str]]:
+    """
+    Загружает строки модов одним запросом с in.(...) на чанк вместо запроса на каждый мод
+    
+    Чанки по IN_FILTER_CHUNK_SIZE, при нескольких чанках - параллельно.
+    
+    Returns:
+        (source_id -> строка мода как есть из БД, source_id из чанков, которые не загрузились)
+    """
+    unique_ids = list(dict.fromkeys(source_ids))
+    chunks = [unique_ids[i:i + IN_FILTER_CHUNK_SIZE] for i in range(0, len(unique_ids), IN_FILTER_CHUNK_SIZE)]
+    
+    def fetch_chunk(chunk: List[str]):
+        try:
+            response = SESSION.get(
+                f'{supabase_url}/rest/v1/mods',
+                params={'source_id': f"in.({','.join(chunk)})", 'select': '*'},
+                headers={
+                    'apikey': supabase_key,
+                    'Authorization': f'Bearer {supabase_key}'
+                },
+                timeout=timeout
+            )
+            
+            if response.status_code == 200:
+                return json_loads(response.content)
+            logger.warning("   ⚠️  Failed to fetch %s mods: HTTP %s", len(chunk), response.status_code)
+        except Exception as e:
+            logger.warning("   ⚠️  Failed to fetch %s mods: %s", len(chunk), e)
+        return None
+    
+    if len(chunks) <= 1:
+        results = [fetch_chunk(chunk) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(chunks))) as executor:
+            results = list(executor.map(fetch_chunk, chunks))
+    
+    rows_by_id: Dict[str, Dict] = {}
+    failed_ids: List[str] = []
+    for chunk, rows in zip(chunks, results):
+        if rows is None:
+            failed_ids.extend(chunk)
+            continue
+        for row in rows:
+            if row.get('source_id'):
+                rows_by_id.setdefault(row['source_id'], row)
+    
+    return rows_by_id, failed_ids
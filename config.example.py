@@ -49,11 +49,11 @@ RATE_LIMITS = {
 # =============================================================================
 
 # Essential Libraries (automatically added to all modpacks)
-ESSENTIAL_LIBRARIES = [
+ESSENTIAL_LIBRARIES = (
     'fabric-api',  # Fabric API (for Fabric loader)
     'cloth-config',  # Config library
     'architectury-api',  # Cross-loader API
-]
+)
 
 # Baseline Mods (performance optimizations, added by default)
 # These are tagged in database with 'baseline-mod' tag
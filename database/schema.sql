@@ -299,3 +299,75 @@ CREATE TABLE public.users (
   CONSTRAINT users_id_fkey FOREIGN KEY (id) REFERENCES auth.users(id)
 );
 
+
+-- Атомарный merge несовместимостей (feedback_processor._merge_incompatibilities). Деплой: database/migrations/001_merge_incompat.sql
+-- Одна транзакция с блокировкой строки вместо GET + PATCH из Python: нет потерянных обновлений при параллельных жалобах.
+-- Legacy-строки, где incompatibilities хранится JSON-строкой, разбираются так же, как в GET + PATCH
+-- (пустая строка и не-объект - пустой объект; битый JSON - ошибка, строка не перезаписывается).
+-- Если p_increment_key уже есть у мода - увеличивает его reported_count (не число - считается 1)
+-- и пишет latest_reason, иначе мержит p_patch поверх текущего объекта. Возвращает false, если мод не найден.
+CREATE OR REPLACE FUNCTION public.merge_incompat(
+  p_source_id text,
+  p_patch jsonb,
+  p_increment_key text DEFAULT NULL,
+  p_latest_reason text DEFAULT NULL
+) RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_incompats jsonb;
+  v_entry jsonb;
+  v_count_text text;
+  v_count integer;
+BEGIN
+  SELECT m.incompatibilities INTO v_incompats
+  FROM public.mods m
+  WHERE m.source_id = p_source_id
+  FOR UPDATE;
+
+  IF NOT FOUND THEN
+    RETURN false;
+  END IF;
+
+  IF jsonb_typeof(v_incompats) = 'string' THEN
+    IF btrim(v_incompats #>> '{}') = '' THEN
+      v_incompats := NULL;
+    ELSE
+      BEGIN
+        v_incompats := (v_incompats #>> '{}')::jsonb;
+      EXCEPTION WHEN others THEN
+        RAISE EXCEPTION 'merge_incompat: incompatibilities of % is not valid JSON', p_source_id;
+      END;
+    END IF;
+  END IF;
+
+  IF v_incompats IS NULL OR jsonb_typeof(v_incompats) <> 'object' THEN
+    v_incompats := '{}'::jsonb;
+  END IF;
+
+  v_entry := v_incompats -> p_increment_key;
+
+  IF p_increment_key IS NOT NULL AND jsonb_typeof(v_entry) = 'object' THEN
+    v_count_text := v_entry ->> 'reported_count';
+    IF v_count_text ~ '^\s*[0-9]{1,9}(\.[0-9]*)?\s*$' THEN
+      v_count := floor(v_count_text::numeric)::integer;
+    ELSE
+      v_count := 1;
+    END IF;
+
+    v_incompats := jsonb_set(
+      v_incompats,
+      ARRAY[p_increment_key],
+      v_entry || jsonb_build_object('reported_count', v_count + 1, 'latest_reason', p_latest_reason)
+    );
+  ELSE
+    v_incompats := v_incompats || p_patch;
+  END IF;
+
+  UPDATE public.mods m
+  SET incompatibilities = v_incompats
+  WHERE m.source_id = p_source_id;
+
+  RETURN true;
+END;
+$$;